@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import calcInfo
+
+# byteSource 位于子目录中, 与 TestByteSource.py 一样直接导入
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'byteSource'))
+import byteSource  # noqa: E402
+
+# 默认测试的输入大小
+DEFAULT_SIZES = ['1K', '1M', '16M']
+# 默认测试的概率分布
+DEFAULT_DISTRIBUTIONS = ['uniform', 'csv', 'degenerate', 'bDMS']
+# csv 分布使用的概率分布文件
+DEFAULT_PDF_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'byteSource', 'input',
+                               'PDF.byte.uniform.csv')
+
+
+def parse_size(text):
+    """
+    将带单位的大小解析为字节数, 如 1K, 16M, 1G
+    :param text: 大小字符串
+    :return: 字节数
+    """
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    if text[-1].upper() in units:
+        return int(float(text[:-1]) * units[text[-1].upper()])
+    return int(text)
+
+
+def distribution(name, path, p_true=0.2):
+    """
+    生成用于测试的概率分布
+    :param name: 分布名称: uniform, csv, degenerate, bDMS
+    :param path: 临时文件路径, bDMS 分布的概率分布文件写到这里
+    :param p_true: bDMS 分布中1的概率
+    :return: 概率分布数组(np.array)
+    """
+    if name == 'uniform':
+        return np.full(256, 1 / 256)
+    if name == 'csv':
+        return byteSource.read_as_probability_distribution(DEFAULT_PDF_CSV)
+    if name == 'degenerate':
+        return np.array([1. if n == 0 else 0. for n in range(256)])
+    if name == 'bDMS':
+        byteSource.generate_bDMS_extended_source_prob_file(p_true, path)
+        return byteSource.read_as_probability_distribution(path)
+    raise ValueError(f'Unknown distribution: {name}')
+
+
+def measure(func, size, repeat):
+    """
+    测量函数的耗时, 吞吐量与峰值内存
+    :param func: 无参数的被测函数
+    :param size: 每次调用处理的字节数
+    :param repeat: 重复次数, 取最快的一次
+    :return: 测量结果(dict)
+    """
+    seconds = min(timeit.repeat(func, number=1, repeat=repeat))
+    # 单独运行一次统计峰值内存, tracemalloc 的开销不计入耗时
+    tracemalloc.start()
+    func()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': seconds, 'mb_per_s': size / seconds / (1 << 20) if seconds else None,
+            'peak_bytes': peak_bytes}
+
+
+def run_benchmark(sizes, distributions, repeat=3, work_dir='.'):
+    """
+    对 calcInfo 与 byteSource 的热点函数运行基准测试
+    :param sizes: 输入大小(字节)的列表
+    :param distributions: 概率分布名称的列表
+    :param repeat: 每项测试的重复次数
+    :param work_dir: 临时文件目录
+    :return: 测量结果的列表
+    """
+    results = []
+    data_path = os.path.join(work_dir, 'BenchFile')
+    prob_path = os.path.join(work_dir, 'BenchProb.csv')
+
+    def record(function, size, dist, func, processed=None):
+        result = {'function': function, 'size': size, 'distribution': dist}
+        result.update(measure(func, size if processed is None else processed, repeat))
+        results.append(result)
+
+    for dist in distributions:
+        symbol_prob = distribution(dist, prob_path)
+        symbol_cumsum = byteSource.CDF(symbol_prob)
+        # 与概率分布数组大小相关的函数, 每项只需测试一次
+        record('read_as_probability_distribution', 256, dist,
+               lambda: byteSource.read_as_probability_distribution(DEFAULT_PDF_CSV if dist != 'bDMS' else prob_path),
+               os.path.getsize(DEFAULT_PDF_CSV if dist != 'bDMS' else prob_path))
+        record('CDF', 256, dist, lambda: byteSource.CDF(symbol_prob), symbol_prob.nbytes)
+        record('self_info', 256, dist, lambda: calcInfo.self_info(symbol_prob, np.zeros(256)), symbol_prob.nbytes)
+        record('entropy', 256, dist, lambda: calcInfo.entropy(symbol_prob), symbol_prob.nbytes)
+        for size in sizes:
+            symbol_random = byteSource.rand_arr(size)
+            msg = byteSource.gen_msg_arr(symbol_cumsum, symbol_random)
+            byteSource.save_as_byte_source(data_path, msg)
+            record('rand_arr', size, dist, lambda: byteSource.rand_arr(size))
+            record('gen_msg_arr', size, dist, lambda: byteSource.gen_msg_arr(symbol_cumsum, symbol_random))
+            record('probability', size, dist, lambda: calcInfo.probability(msg))
+            record('open_file_as_binary_array', size, dist, lambda: calcInfo.open_file_as_binary_array(data_path))
+            record('file_byte_count', size, dist, lambda: calcInfo.file_byte_count(data_path))
+            del symbol_random, msg
+
+    for path in [data_path, prob_path]:
+        if os.path.exists(path):
+            os.remove(path)
+    return results
+
+
+def parse_args():
+    """
+    根据命令行命令运行基准测试
+    :return: None
+    """
+    import argparse
+    import platform
+    import time
+    # 程序简介
+    parser = argparse.ArgumentParser(description='Benchmark hot paths of calcInfo and byteSource')
+    # sizes 参数, 输入大小
+    parser.add_argument('-n', '--sizes', nargs='+', default=DEFAULT_SIZES,
+                        help='input sizes, with optional K/M/G suffix')
+    # distributions 参数, 概率分布
+    parser.add_argument('-d', '--distributions', nargs='+', default=DEFAULT_DISTRIBUTIONS,
+                        choices=DEFAULT_DISTRIBUTIONS, help='probability distributions of the input')
+    # repeat 参数, 重复次数
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='runs per measurement, the fastest is reported')
+    # output 参数, 结果文件路径
+    parser.add_argument('-o', '--output',
+                        help='write JSON results to OUTPUT instead of stdout')
+
+    # 处理输入的命令
+    args = parser.parse_args()
+
+    report = {
+        'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'results': run_benchmark([parse_size(size) for size in args.sizes], args.distributions, args.repeat)
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=1)
+        output_file.close()
+    else:
+        json.dump(report, sys.stdout, indent=1)
+
+
+if __name__ == '__main__':
+    parse_args()
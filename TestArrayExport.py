@@ -0,0 +1,65 @@
+import csv
+import os
+import unittest
+
+import numpy as np
+
+import arrayExport
+
+
+class ArrayExportTestCase(unittest.TestCase):
+    def test_export_array(self):
+        symbols, values = np.arange(256), np.random.random(256)
+        values[:3] = [0, 1e-300, np.inf]
+        # CSV 与 csv.writer 的输出逐字节相同
+        with open('TestExpected.csv', 'w', newline='') as expected_file:
+            csv.writer(expected_file).writerows(zip(symbols.tolist(), values.tolist()))
+        expected_file.close()
+        arrayExport.export_array('TestFile.csv', [symbols, values])
+        with open('TestExpected.csv', 'rb') as expected_file, open('TestFile.csv', 'rb') as file:
+            self.assertEqual(expected_file.read(), file.read())
+        # 附加模式
+        arrayExport.export_array('TestFile.csv', [symbols[:2], values[:2]], append=True)
+        with open('TestFile.csv', 'r', newline='') as file:
+            self.assertEqual(258, len(list(csv.reader(file))))
+        # 二进制格式可内存映射读入
+        arrayExport.export_array('TestFile.npy', [symbols, values], ['symbol', 'value'])
+        records = np.load('TestFile.npy', mmap_mode='r')
+        self.assertEqual(('symbol', 'value'), records.dtype.names)
+        self.assertTrue(np.array_equal(values, records['value']))
+        del records
+        arrayExport.export_array('TestFile.raw', [values])
+        self.assertTrue(np.array_equal(values, np.fromfile('TestFile.raw')))
+        # 非数值列与常量列按 csv.writer 的规则加引号
+        names = np.array(['a', 'b,c', 'd"e', 'f\ng', '100%'])
+        with open('TestExpected.csv', 'w', newline='') as expected_file:
+            csv.writer(expected_file).writerows(zip(['x,%d'] * 5, names.tolist(), values[:5].tolist()))
+        expected_file.close()
+        arrayExport.export_array('TestFile.csv', ['x,%d', names, values[:5]])
+        with open('TestExpected.csv', 'rb') as expected_file, open('TestFile.csv', 'rb') as file:
+            self.assertEqual(expected_file.read(), file.read())
+        # 常量列在二进制格式中展开为整列
+        arrayExport.export_array('TestFile.raw', [7, symbols], ['constant', 'symbol'])
+        self.assertTrue(np.all(7 == np.fromfile('TestFile.raw', dtype=[('constant', int), ('symbol', int)])
+                               ['constant']))
+        for path in ['TestExpected.csv', 'TestFile.csv', 'TestFile.npy', 'TestFile.raw']:
+            os.remove(path)
+
+    def test_array_writer(self):
+        data = np.random.default_rng(1).integers(0, 1 << 32, 1000, dtype=np.uint32)
+        # 分块写入与一次写入结果相同
+        for path in ['TestFile.csv', 'TestFile.npy', 'TestFile.bin']:
+            with arrayExport.ArrayWriter(path, data.size, data.dtype) as writer:
+                for begin in range(0, data.size, 300):
+                    writer.write(data[begin:begin + 300], chunk_rows=7)
+        with open('TestFile.csv', 'r', newline='') as file:
+            self.assertEqual(data.tolist(), [int(row[0]) for row in csv.reader(file)])
+        self.assertTrue(np.array_equal(data, np.load('TestFile.npy')))
+        self.assertTrue(np.array_equal(data, np.fromfile('TestFile.bin', dtype=np.uint32)))
+        for path in ['TestFile.csv', 'TestFile.npy', 'TestFile.bin']:
+            os.remove(path)
+        self.assertRaises(ValueError, arrayExport.ArrayWriter, 'TestFile.npy')
+
+
+if __name__ == '__main__':
+    unittest.main()
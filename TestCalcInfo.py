@@ -1,4 +1,6 @@
+import io
 import os
+import socket
 import unittest
 
 import numpy as np
@@ -40,6 +42,259 @@ class CalcInfoTestCase(unittest.TestCase):
         expected_entropy, actual_entropy = 1, calcInfo.entropy(np.array([0.5 if n <= 1 else 0 for n in range(256)]))
         self.assertNpArrAlmostEqual(expected_entropy, actual_entropy)
 
+    def test_entropy_profile(self):
+        data = np.concatenate((np.full(1000, 7, dtype=np.uint8), np.random.randint(0, 256, 3000).astype(np.uint8)))
+        # 整除, 不重叠, 以及不整除窗口大小的间隔, 每批只处理少量窗口以覆盖分批逻辑
+        for block_size, stride in [(256, None), (256, 64), (100, 30), (4000, 1), (5000, 1)]:
+            offsets, entropies = calcInfo.entropy_profile(data, block_size, stride, chunk_size=4096)
+            expected_offsets = np.arange(0, data.size - block_size + 1, stride or block_size)
+            expected_entropies = [calcInfo.entropy(calcInfo.probability(data[offset:offset + block_size]))
+                                  for offset in expected_offsets]
+            self.assertTrue(np.array_equal(expected_offsets, offsets))
+            self.assertTrue(np.allclose(expected_entropies, entropies))
+        # 全部相同的符号构成的窗口信息熵为 0
+        self.assertEqual(0, calcInfo.entropy_profile(data, 500)[1][0])
+        self.assertEqual(0, calcInfo.entropy_profile(data, 5000, 1)[0].size)
+        # 大窗口, 间隔为 1: 每批的计数矩阵与窗口大小无关, 抽查首尾与中间的窗口
+        data = np.random.randint(0, 256, 1 << 17).astype(np.uint8)
+        offsets, entropies = calcInfo.entropy_profile(data, 1 << 16, 1, chunk_size=1 << 16)
+        self.assertEqual((1 << 16) + 1, entropies.size)
+        for index in [0, 1, 12345, entropies.size - 1]:
+            self.assertAlmostEqual(calcInfo.entropy(calcInfo.probability(data[offsets[index]:][:1 << 16])),
+                                   entropies[index])
+
+    def test_ngram_count(self):
+        def expected_entropy(data, order):
+            # 直接以元组为键计数, 作为参照
+            from collections import Counter
+            counts = Counter(bytes(data[i:i + order]) for i in range(data.size - order + 1))
+            return calcInfo.count_entropy(np.array(list(counts.values())))
+
+        data = np.random.randint(0, 4, 5000).astype(np.uint8)
+        with open('TestFile', 'wb+') as file:
+            file.write(data.tobytes())
+        file.close()
+        # 块大小不整除文件大小, 覆盖跨块元组的统计
+        counters = calcInfo.file_ngram_count(file.name, calcInfo.MAX_ORDER, chunk_size=333)
+        os.remove(file.name)
+        for order, counter in enumerate(counters, 1):
+            self.assertEqual(data.size - order + 1, counter.total())
+            self.assertAlmostEqual(expected_entropy(data, order), counter.entropy())
+        block_entropies, cond_entropies = calcInfo.conditional_entropies(counters)
+        self.assertAlmostEqual(block_entropies[0], cond_entropies[0])
+        self.assertAlmostEqual(block_entropies[3] - block_entropies[2], cond_entropies[3])
+        # 周期为 2 的序列: 已知前一个字节后, 下一个字节完全确定
+        counters = calcInfo.stream_ngram_count(io.BytesIO(bytes([0, 1] * 1000)), 3, chunk_size=7)
+        self.assertAlmostEqual(1, calcInfo.conditional_entropies(counters)[1][0])
+        self.assertAlmostEqual(0, calcInfo.conditional_entropies(counters)[1][2], places=5)
+        # 有序稀疏计数的合并与整体计数一致, uint32 与 int64 的计数合并为 int64
+        codes = np.random.randint(0, 1 << 32, 3000, dtype=np.uint64).astype(np.uint32)
+        codes = np.concatenate((codes, codes[:1000], codes[:10]))
+        keys, counts = calcInfo.merge_sparse_count(*np.unique(codes[:2000], return_counts=True),
+                                                   *np.unique(codes[2000:], return_counts=True))
+        self.assertEqual([a.tolist() for a in np.unique(codes, return_counts=True)], [keys.tolist(), counts.tolist()])
+        merged_keys, merged_counts = calcInfo.merge_sparse_count(keys, counts.astype(np.uint32), keys[:5], counts[:5])
+        self.assertEqual(np.int64, merged_counts.dtype)
+        self.assertEqual(keys.tolist(), merged_keys.tolist())
+        self.assertEqual((counts[:5] * 2).tolist(), merged_counts[:5].tolist())
+        # 跨越全部 256 个分区的 4 元组, 以及空数据
+        counter = calcInfo.NgramCounter(4)
+        counter.update(codes)
+        self.assertEqual(len(codes), counter.total())
+        self.assertAlmostEqual(calcInfo.count_entropy(np.unique(codes, return_counts=True)[1]), counter.entropy())
+        self.assertEqual(0, calcInfo.NgramCounter(4).entropy())
+
+    def test_symbol_entropies(self):
+        # 查找表: 0xff 中有 8 个 1, 0x12 中 4 位符号 1, 2 各一个
+        self.assertEqual([0, 8], calcInfo.sub_byte_table(1)[0xff].tolist())
+        self.assertEqual([0, 1, 1] + [0] * 13, calcInfo.sub_byte_table(4)[0x12].tolist())
+        data = np.random.randint(0, 256, 4099).astype(np.uint8)
+        with open('TestFile', 'wb+') as file:
+            file.write(data.tobytes())
+        file.close()
+        # 块大小不是 4 的倍数, 覆盖跨块对齐
+        counters = calcInfo.file_symbol_count(file.name, chunk_size=333)
+        os.remove(file.name)
+        expected = []
+        for width in calcInfo.SYMBOL_WIDTHS:
+            if width < 8:
+                symbols = np.unpackbits(data).reshape(-1, width) @ (1 << np.arange(width - 1, -1, -1))
+            else:
+                symbols = data[:data.size // (width // 8) * (width // 8)].view(f'<u{width // 8}')
+            expected.append(calcInfo.count_entropy(np.unique(symbols, return_counts=True)[1]))
+        self.assertEqual(2049, counters[16].total())
+        self.assertEqual(1024, counters[32].total())
+        np.testing.assert_allclose(expected, calcInfo.symbol_entropies(counters))
+        # 元组与符号在同一次读取中统计, 结果与分别统计相同
+        symbol_counters = {16: calcInfo.NgramCounter(2), 32: calcInfo.NgramCounter(4)}
+        ngram_counters = calcInfo.stream_ngram_count(io.BytesIO(data.tobytes()), 3, chunk_size=333,
+                                                     symbol_counters=symbol_counters)
+        symbol_counters[8] = ngram_counters[0]
+        np.testing.assert_allclose(expected, calcInfo.symbol_entropies(symbol_counters))
+        self.assertAlmostEqual(calcInfo.stream_ngram_count(io.BytesIO(data.tobytes()), 3)[2].entropy(),
+                               ngram_counters[2].entropy())
+
+    def test_phase_stats(self):
+        import json
+        data = np.random.randint(0, 256, 10000).astype(np.uint8)
+        with open('TestFile', 'wb+') as file:
+            file.write(data.tobytes())
+        file.close()
+        # 读取与计数在实际计算过程中分别记录, 各自处理全部字节
+        stats = calcInfo.PhaseStats('tracemalloc')
+        counts = calcInfo.file_byte_count(file.name, chunk_size=3000, stats=stats)
+        self.assertTrue(np.array_equal(np.bincount(data, minlength=256), counts))
+        with stats.phase('entropy'):
+            calcInfo.entropy(calcInfo.count_to_probability(counts))
+        self.assertEqual({'read': 10000, 'count': 10000, 'entropy': 0},
+                         {name: phase['bytes'] for name, phase in stats.phases.items()})
+        self.assertEqual(4, stats.phases['count']['calls'])
+        stats.save('TestStats', input=file.name)
+        with open('TestStats') as stats_file:
+            records = [json.loads(line) for line in stats_file]
+        os.remove('TestStats')
+        os.remove(file.name)
+        self.assertEqual(['read', 'count', 'entropy'], [record['phase'] for record in records])
+        self.assertEqual({file.name}, {record['input'] for record in records})
+        self.assertTrue(all(record['peak_traced'] >= 0 for record in records))
+        # Windows 上通过 GetProcessMemoryInfo 获取峰值内存, 其他平台无法调用时返回 None
+        if os.name == 'nt':
+            self.assertGreater(calcInfo.windows_peak_rss(), 0)
+        else:
+            self.assertIsNone(calcInfo.windows_peak_rss())
+        import tracemalloc
+        tracemalloc.stop()
+
+    @unittest.skipUnless(hasattr(os, 'mkfifo'), 'requires named pipes')
+    def test_stream_input(self):
+        import subprocess
+        import sys
+        import threading
+        data = np.random.randint(0, 16, 100000).astype(np.uint8)
+        expected = calcInfo.entropy(calcInfo.count_to_probability(np.bincount(data, minlength=256)))
+        # 命名管道只能顺序读取一次
+        os.mkfifo('TestPipe')
+        self.assertTrue(calcInfo.is_stream_input('TestPipe'))
+        self.assertFalse(calcInfo.is_stream_input('TestCalcInfo.py'))
+
+        def write_pipe():
+            with open('TestPipe', 'wb') as pipe:
+                pipe.write(data.tobytes())
+
+        writer = threading.Thread(target=write_pipe)
+        writer.start()
+        sizes = []
+        with calcInfo.open_input_stream('TestPipe') as stream:
+            counts = calcInfo.stream_byte_count(stream, chunk_size=4096, progress=lambda c: sizes.append(c.sum()))
+        writer.join()
+        os.remove('TestPipe')
+        self.assertAlmostEqual(expected, calcInfo.entropy(calcInfo.count_to_probability(counts)))
+        self.assertEqual(data.size, sizes[-1])
+        # 从标准输入读取, 结果行的路径为 -
+        subprocess.run([sys.executable, 'calcInfo.py', '-', 'TestOutput.csv', '-k', '2', '--progress', '30000'],
+                       input=data.tobytes(), check=True, capture_output=True)
+        with open('TestOutput.csv', 'r') as output_file:
+            row = output_file.read().strip().split(',')
+        os.remove('TestOutput.csv')
+        self.assertEqual(['-', str(data.size)], row[:2])
+        self.assertAlmostEqual(expected, float(row[2]))
+
+    def test_file_follower(self):
+        def expected_row(data):
+            counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+            return [len(data), calcInfo.entropy(calcInfo.count_to_probability(counts))]
+
+        with open('TestFile', 'wb') as file:
+            file.write(b'abcd' * 100)
+        follower = calcInfo.FileFollower(file.name, 'TestState.json', chunk_size=64)
+        self.assertEqual((400, False), follower.update())
+        follower.save()
+        # 追加的字节只读取一次, 重新启动时从状态文件恢复
+        with open(file.name, 'ab') as file:
+            file.write(b'xyz' * 50)
+        follower = calcInfo.FileFollower(file.name, 'TestState.json', chunk_size=64)
+        self.assertEqual(400, follower.offset)
+        self.assertEqual((150, False), follower.update())
+        self.assertEqual((0, False), follower.update())
+        self.assertEqual(expected_row(b'abcd' * 100 + b'xyz' * 50), follower.row()[1:3])
+        # 截断后又增长超过原位置, 开头的内容改变, 重新计数
+        with open(file.name, 'wb') as file:
+            file.write(b'q' * 1000)
+        self.assertEqual((1000, True), follower.update())
+        self.assertEqual(expected_row(b'q' * 1000), follower.row()[1:3])
+        # 截断变短, 重新计数
+        with open(file.name, 'wb') as file:
+            file.write(b'q' * 10)
+        self.assertEqual((10, True), follower.update())
+        # 轮转: 原文件被替换为新文件
+        with open('TestFile.new', 'wb') as file:
+            file.write(b'q' * 10 + b'r' * 10)
+        os.replace('TestFile.new', 'TestFile')
+        self.assertEqual((20, True), follower.update())
+        self.assertEqual(expected_row(b'q' * 10 + b'r' * 10), follower.row()[1:3])
+        # 按路径覆盖的输出会丢失历史行, 跟踪模式拒绝
+        import subprocess
+        import sys
+        for options in [['TestOutput.csv', '-u'], ['TestOutput.db']]:
+            self.assertEqual(2, subprocess.run([sys.executable, 'calcInfo.py', 'TestFile', '-f', '1'] + options,
+                                               capture_output=True, timeout=60).returncode)
+        self.assertFalse(os.path.exists('TestOutput.db'))
+        os.remove('TestFile')
+        os.remove('TestState.json')
+
+    def test_divergence_matrix(self):
+        def reference_divergences(p, q):
+            both = p > 0
+            cross = np.inf if np.any(both & (q == 0)) else -np.sum(p[both] * np.log2(q[both]))
+            m = (p + q) / 2
+            js = calcInfo.entropy(m) - (calcInfo.entropy(p) + calcInfo.entropy(q)) / 2
+            return cross, cross - calcInfo.entropy(p), js
+
+        rng = np.random.default_rng(5)
+        # 稠密, 稀疏与退化的分布混合, 覆盖分块计算中的两种路径
+        p_mat = np.vstack([rng.dirichlet(np.full(256, 0.5), 20), rng.dirichlet(np.full(256, 0.01), 20),
+                           np.eye(256)[:3]])
+        p_mat[p_mat < 1e-4] = 0
+        p_mat /= p_mat.sum(axis=1, keepdims=True)
+        q_mat = np.vstack([np.full(256, 1 / 256), p_mat[0]])
+        cross_entropies = calcInfo.cross_entropy_matrix(p_mat, q_mat)
+        divergences = calcInfo.kl_divergence_matrix(p_mat, q_mat)
+        js_matrix = calcInfo.js_divergence_matrix(p_mat, block=7)
+        for i in range(len(p_mat)):
+            for j in range(len(q_mat)):
+                cross, divergence, _ = reference_divergences(p_mat[i], q_mat[j])
+                self.assertAlmostEqual(cross, cross_entropies[i, j])
+                self.assertAlmostEqual(divergence, divergences[i, j])
+            for j in range(len(p_mat)):
+                self.assertAlmostEqual(reference_divergences(p_mat[i], p_mat[j])[2], js_matrix[i, j])
+        self.assertTrue(np.array_equal(js_matrix, js_matrix.T))
+        # 整个矩阵只有一个对角块时同样严格对称
+        full_matrix = calcInfo.js_divergence_matrix(p_mat, threads=2)
+        self.assertTrue(np.array_equal(full_matrix, full_matrix.T))
+        np.testing.assert_allclose(js_matrix, full_matrix, atol=1e-12)
+        # 舍入误差不会使 KL 散度为负
+        self.assertTrue(np.all(calcInfo.kl_divergence_matrix(p_mat, p_mat) >= 0))
+
+    def test_estimate_entropy(self):
+        # Miller-Madow 修正: 2 个符号各出现 2 次时, 修正量为 1/(2*4*ln2)
+        self.assertAlmostEqual(1 + 1 / (8 * np.log(2)), calcInfo.miller_madow_entropy(np.array([2, 2] + [0] * 254)))
+        data = np.random.randint(0, 16, 1 << 20).astype(np.uint8)
+        with open('TestFile', 'wb+') as file:
+            file.write(data.tobytes())
+        file.close()
+        expected = calcInfo.entropy(calcInfo.probability(data))
+        estimate, low, high, sampled = calcInfo.estimate_entropy(file.name, 1024, 32, seed=1)
+        self.assertEqual(1024 * 32, sampled)
+        self.assertTrue(low <= estimate <= high)
+        self.assertAlmostEqual(expected, estimate, places=2)
+        # 置信区间足够窄时提前停止, 否则抽样块数达到上限
+        self.assertEqual(1024 * 32, calcInfo.estimate_entropy(file.name, 1024, 32, tolerance=1, seed=1)[3])
+        self.assertEqual(1024 * 96, calcInfo.estimate_entropy(file.name, 1024, 32, tolerance=0, max_blocks=96)[3])
+        # 文件不比抽样量大时精确计算
+        self.assertEqual((expected, expected, expected, data.size),
+                         calcInfo.estimate_entropy(file.name, 1 << 20, 1))
+        os.remove(file.name)
+
     def test_open_file_as_binary_arr(self):
 
         def test_file(data):
@@ -60,6 +315,204 @@ class CalcInfoTestCase(unittest.TestCase):
         open_from_file_data = test_file(expected_data)
         self.assertNpArrAlmostEqual(expected_data, open_from_file_data)
 
+    def test_file_byte_count(self):
+        data = np.random.randint(0, 256, 100000).astype(np.uint8)
+        with open('TestFile', 'wb+') as file:
+            file.write(data.tobytes())
+        file.close()
+        expected_p = np.histogram(data, bins=range(0, 257), density=True)[0]
+        # 不同的块大小(包括不能整除文件大小的块)都应得到与一次性读入完全一致的结果
+        for chunk_size in [777, 4096, 99999, 1 << 20]:
+            counts = calcInfo.file_byte_count(file.name, chunk_size)
+            self.assertEqual(data.size, counts.sum())
+            self.assertTrue(np.array_equal(expected_p, calcInfo.count_to_probability(counts)))
+            self.assertEqual(calcInfo.entropy(expected_p), calcInfo.entropy(calcInfo.count_to_probability(counts)))
+        os.remove(file.name)
+
+    def test_file_byte_count_threads(self):
+        data = np.random.randint(0, 256, 100003).astype(np.uint8)
+        with open('TestFile', 'wb+') as file:
+            file.write(data.tobytes())
+        file.close()
+        expected_counts = calcInfo.file_byte_count(file.name, 4096)
+        # 多线程按区间计数的结果与顺序计数逐位一致
+        for threads in [2, 3, 7, 0]:
+            self.assertTrue(np.array_equal(expected_counts, calcInfo.file_byte_count(file.name, 4096, threads)))
+        self.assertTrue(np.array_equal(calcInfo.byte_count(data[1000:50000]),
+                                       calcInfo.range_byte_count(file.name, 1000, 50000, 4096)))
+        os.remove(file.name)
+
+    def test_calc_files_entropy(self):
+        os.makedirs('TestDir/sub', exist_ok=True)
+        expected_rows = []
+        for i, data in enumerate([np.arange(256, dtype=np.uint8), np.full(256, 1, dtype=np.uint8),
+                                  np.repeat(np.array([0, 1]).astype(np.uint8), 128)]):
+            path = os.path.join('TestDir', f'file{i}.bin')
+            with open(path, 'wb+') as file:
+                file.write(data.tobytes())
+            file.close()
+            expected_rows.append([path, 256, calcInfo.entropy(calcInfo.probability(data))])
+        with open('TestDir/sub/file3.bin', 'wb+') as file:
+            file.write(b'\x00')
+        file.close()
+        # 目录与通配符按路径排序展开, 子目录只在递归时展开
+        paths = [row[0] for row in expected_rows]
+        self.assertEqual(paths, calcInfo.expand_input_paths('TestDir'))
+        self.assertEqual(paths, calcInfo.expand_input_paths(os.path.join('TestDir', '*.bin')))
+        self.assertEqual(paths + [os.path.join('TestDir', 'sub', 'file3.bin')],
+                         calcInfo.expand_input_paths('TestDir', recursive=True))
+        # 文件列表保持列表中的顺序
+        with open('TestDir/list.txt', 'w') as list_file:
+            list_file.write('\n'.join(reversed(paths)) + '\n')
+        list_file.close()
+        self.assertEqual(list(reversed(paths)), calcInfo.expand_input_paths('@TestDir/list.txt'))
+        # 多进程计算的结果顺序与输入顺序一致
+        self.assertEqual(expected_rows, calcInfo.calc_files_entropy(paths, jobs=1))
+        self.assertEqual(expected_rows, calcInfo.calc_files_entropy(paths, jobs=2))
+        # 无法读取的文件不中断整批计算, 其结果为 None
+        missing = os.path.join('TestDir', 'missing.bin')
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(expected_rows[:1] + [None] + expected_rows[1:],
+                             calcInfo.calc_files_entropy(paths[:1] + [missing] + paths[1:], jobs=1,
+                                                         skip_errors=True))
+        with self.assertRaises(FileNotFoundError):
+            calcInfo.calc_files_entropy([missing])
+        # 批量计算同样记录各阶段统计, 不记录统计的模式拒绝 --stats
+        import json
+        import subprocess
+        import sys
+        subprocess.run([sys.executable, 'calcInfo.py', 'TestDir', 'TestOutput.csv', '--stats', 'TestStats'],
+                       check=True, capture_output=True)
+        with open('TestStats') as stats_file:
+            records = [json.loads(line) for line in stats_file]
+        size = sum(os.path.getsize(path) for path in calcInfo.expand_input_paths('TestDir'))
+        self.assertEqual([('count', size), ('export', 0)], [(record['phase'], record['bytes']) for record in records])
+        self.assertEqual({'TestDir'}, {record['input'] for record in records})
+        self.assertTrue(all(record['peak_rss'] > 0 for record in records))
+        for options in [['-f', '1', '--stats', 'TestStats'], ['-j', '2', '--trace', 'cprofile']]:
+            self.assertEqual(2, subprocess.run([sys.executable, 'calcInfo.py', 'TestDir', 'TestOutput.csv'] + options,
+                                               capture_output=True).returncode)
+        os.remove('TestStats')
+        os.remove('TestOutput.csv')
+        import shutil
+        shutil.rmtree('TestDir')
+
+    def test_byte_histogram(self):
+        shards = [np.random.randint(0, 256, size).astype(np.uint8) for size in [100, 1000, 70000]]
+        data = np.concatenate(shards)
+        histograms = [calcInfo.ByteHistogram.from_array(shard) for shard in shards]
+        # 分片直方图合并后与整体计算的结果一致
+        merged = histograms[0] + histograms[1] + histograms[2]
+        self.assertEqual(calcInfo.ByteHistogram.from_array(data), merged)
+        self.assertEqual(data.size, merged.total())
+        self.assertTrue(np.array_equal(calcInfo.probability(data), merged.probability()))
+        self.assertEqual(calcInfo.entropy(calcInfo.probability(data)), merged.entropy())
+        self.assertTrue(np.allclose(calcInfo.self_info(calcInfo.probability(data), np.zeros(256)),
+                                    merged.self_info()))
+        self.assertEqual(histograms[2], merged - histograms[0] - histograms[1])
+        self.assertRaises(ValueError, histograms[0].subtract, merged)
+        # 序列化使用能容纳最大计数的最小宽度
+        for histogram, width in zip(histograms, [1, 1, 2]):
+            data_bytes = histogram.dumps()
+            self.assertEqual(6 + 256 * width, len(data_bytes))
+            self.assertEqual(histogram, calcInfo.ByteHistogram.loads(data_bytes))
+        self.assertEqual(6 + 256 * 8, len(calcInfo.ByteHistogram(np.full(256, 1 << 40)).dumps()))
+        self.assertRaises(ValueError, calcInfo.ByteHistogram.loads, b'BHST\x01\x02')
+        merged.save('TestFile')
+        self.assertEqual(merged, calcInfo.ByteHistogram.load('TestFile'))
+        os.remove('TestFile')
+
+    def test_count_cache(self):
+        with open('TestFile', 'wb+') as file:
+            file.write(np.arange(256, dtype=np.uint8).tobytes())
+        file.close()
+        cache = calcInfo.CountCache('TestCache', max_size=1 << 20)
+        self.assertTrue(np.array_equal(np.ones(256), cache.file_byte_count(file.name)))
+        # 文件未改变时直接返回缓存的计数
+        key = cache.key(file.name)
+        cache.save(key, np.full(256, 2))
+        self.assertTrue(np.array_equal(np.full(256, 2), cache.file_byte_count(file.name)))
+        # 修改时间或内容改变后重新计数
+        os.utime(file.name, ns=(0, 0))
+        self.assertNotEqual(key, cache.key(file.name))
+        self.assertTrue(np.array_equal(np.ones(256), cache.file_byte_count(file.name)))
+        self.assertNotEqual(cache.key(file.name), calcInfo.CountCache('TestCache', content_hash=True).key(file.name))
+        # 超出大小上限时淘汰最久未使用的条目
+        self.assertEqual(0, cache.evict())
+        cache.max_size = 0
+        self.assertEqual(2, cache.evict())
+        os.remove(file.name)
+        os.rmdir('TestCache')
+
+    def test_upsert_csv_rows(self):
+        calcInfo.upsert_csv_rows('result.csv', [['a', 1, 1.0], ['b', 2, 2.0]])
+        calcInfo.upsert_csv_rows('result.csv', [['b', 3, 3.0], ['c', 4, 4.0]])
+        import csv
+        with open('result.csv', 'r') as csv_file:
+            self.assertEqual([['a', '1', '1.0'], ['b', '3', '3.0'], ['c', '4', '4.0']], list(csv.reader(csv_file)))
+        csv_file.close()
+        os.remove(csv_file.name)
+
+    def test_result_store(self):
+        paths = ['TestFile.txt', 'TestFile.bin', 'TestFile2.txt']
+        for path, data in zip(paths, [b'a' * 64, bytes(range(256)), b'ab' * 32]):
+            with open(path, 'wb') as file:
+                file.write(data)
+            file.close()
+        results = calcInfo.calc_files_entropy(paths, jobs=2, order=2, with_counts=True)
+        with calcInfo.ResultStore('TestResult.db') as store:
+            store.insert([row for row, _ in results], [counts for _, counts in results],
+                         ['block_entropy_2', 'conditional_entropy_2'])
+            # 主键相同的行被更新而不是重复插入
+            store.insert([results[0][0]], [results[0][1]])
+            self.assertEqual([['TestFile.bin', 256, 8.0], ['TestFile2.txt', 64, 1.0]], store.top(2))
+            self.assertEqual([['TestFile2.txt', 64, 1.0]], store.top(1, '*.txt'))
+            files, histogram = store.aggregate('*.txt')
+            self.assertEqual(2, files)
+            self.assertEqual(96, histogram.counts[ord('a')])
+            self.assertEqual(32, histogram.counts[ord('b')])
+            self.assertEqual(3, store.aggregate()[0])
+            self.assertEqual('wal', store.connection.execute('PRAGMA journal_mode').fetchone()[0])
+            # 其余列以带名称的 JSON 对象保存, 未命名的列按位置命名
+            import json
+            extra = store.connection.execute("SELECT extra FROM results WHERE path = 'TestFile.bin'").fetchone()[0]
+            self.assertEqual(['block_entropy_2', 'conditional_entropy_2'], list(json.loads(extra)))
+            extra = store.connection.execute("SELECT extra FROM results WHERE path = 'TestFile.txt'").fetchone()[0]
+            self.assertEqual(['column3', 'column4'], list(json.loads(extra)))
+        for path in paths + ['TestResult.db']:
+            os.remove(path)
+
+    def test_calc_archives_entropy(self):
+        import gzip
+        import tarfile
+        import zipfile
+        members = {'a.bin': np.arange(256, dtype=np.uint8).tobytes(), 'b.bin': bytes(1000),
+                   'c.bin': np.random.randint(0, 4, 5000).astype(np.uint8).tobytes()}
+        expected = {name: calcInfo.entropy(calcInfo.probability(np.frombuffer(data, dtype=np.uint8)))
+                    for name, data in members.items()}
+        with zipfile.ZipFile('TestFile.zip', 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        with tarfile.open('TestFile.tar.gz', 'w:gz') as archive:
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        with gzip.open('TestFile.c.bin.gz', 'wb') as stream:
+            stream.write(members['c.bin'])
+        paths = ['TestFile.zip', 'TestFile.tar.gz', 'TestFile.c.bin.gz']
+        self.assertEqual(['zip', 'tar', 'stream'], [calcInfo.archive_type(path) for path in paths])
+        expected_rows = [[f'{path}!{name}', len(members[name]), expected[name]]
+                         for path in paths[:2] for name in members] + \
+                        [['TestFile.c.bin.gz!TestFile.c.bin', len(members['c.bin']), expected['c.bin']]]
+        # 逐块解压(块大小小于成员大小), 单进程与多进程的结果一致
+        for jobs in [1, 2]:
+            rows = calcInfo.calc_archives_entropy(paths, jobs, chunk_size=300)
+            self.assertEqual([row[:2] for row in expected_rows], [row[:2] for row in rows])
+            self.assertTrue(np.allclose([row[2] for row in expected_rows], [row[2] for row in rows]))
+        for path in paths:
+            os.remove(path)
+
     def test_append_to_csv_by_row(self):
 
         def test_file(data):
@@ -84,5 +537,66 @@ class CalcInfoTestCase(unittest.TestCase):
         test_file(expected_data)
 
 
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'requires Unix sockets')
+    def test_serve_entropy(self):
+        import asyncio
+        import threading
+        import time
+        import calcInfoClient
+
+        def run():
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+
+        loop = asyncio.new_event_loop()
+        # 上限为 0 的缓存: 写入的条目在请求之后即被淘汰
+        cache = calcInfo.CountCache('TestCache', 0)
+        task = loop.create_task(calcInfo.serve_entropy('TestSocket', jobs=2, cache=cache))
+        thread = threading.Thread(target=run)
+        thread.start()
+        while not os.path.exists('TestSocket'):
+            time.sleep(0.01)
+        data = bytes(range(256)) * 4 + b'\0' * 1024
+        with open('TestFile', 'wb') as file:
+            file.write(data)
+        file.close()
+        with calcInfoClient.connect('TestSocket') as client:
+            reader = client.makefile('rb')
+            # 路径请求与原始字节请求的结果与结果行一致
+            expected = calcInfo.calc_file_entropy(file.name, order=2)
+            result = calcInfoClient.request(client, reader, {'path': file.name, 'order': 2, 'P': True})
+            self.assertEqual(expected, [result[key] for key in ['path', 'size', 'entropy', 'block_entropy',
+                                                                 'conditional_entropy']])
+            self.assertAlmostEqual(0.5 + 0.5 / 256, result['P'][0])
+            result = calcInfoClient.request(client, reader, {'name': 'raw', 'S': True}, data)
+            self.assertEqual(['raw', len(data), expected[2]], [result['path'], result['size'], result['entropy']])
+            self.assertEqual(256, len(result['S']))
+            # 分块发送的原始字节边接收边计数, 计算出错时剩余的块被丢弃, 连接仍可继续使用
+            chunk_size, calcInfoClient.CHUNK_SIZE = calcInfoClient.CHUNK_SIZE, 100
+            result = calcInfoClient.request(client, reader, {'name': 'chunked', 'order': 2}, io.BytesIO(data))
+            self.assertEqual(['chunked'] + expected[1:], [result[key] for key in ['path', 'size', 'entropy',
+                                                                                  'block_entropy',
+                                                                                  'conditional_entropy']])
+            self.assertIn('error', calcInfoClient.request(client, reader, {'order': 9}, io.BytesIO(data)))
+            self.assertEqual(1, calcInfoClient.request(client, reader, {'name': 'one'}, io.BytesIO(b'\x01'))['size'])
+            calcInfoClient.CHUNK_SIZE = chunk_size
+            # 错误的请求返回错误, 连接仍可继续使用
+            self.assertIn('error', calcInfoClient.request(client, reader, {'path': 'NoSuchFile'}))
+            self.assertIn('error', calcInfoClient.request(client, reader, {'path': file.name, 'order': 9}))
+            self.assertEqual(len(data), calcInfoClient.request(client, reader, {'path': file.name})['size'])
+            # 同一连接的下一个请求在淘汰之后才处理
+            self.assertIn('error', calcInfoClient.request(client, reader, {'path': 'NoSuchFile'}))
+            self.assertEqual(1, cache.writes)
+            self.assertEqual([], os.listdir('TestCache'))
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join()
+        loop.close()
+        os.remove(file.name)
+        os.rmdir('TestCache')
+        self.assertFalse(os.path.exists('TestSocket'))
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,166 @@
+import numpy as np
+
+# 每次格式化并写入的行数, 决定了导出过程中的峰值内存
+DEFAULT_CHUNK_ROWS = 1 << 16
+# 文本输出的缓冲区大小(字节)
+BUFFER_SIZE = 1 << 20
+# CSV 的行结束符, 与 csv.writer 的默认值相同
+LINE_TERMINATOR = '\r\n'
+# 以二进制数组保存的扩展名, 其余均保存为CSV
+NPY_EXTENSIONS, RAW_EXTENSIONS = ('.npy',), ('.raw', '.bin')
+
+
+def csv_field(value):
+    """
+    按 csv.writer 的默认规则(QUOTE_MINIMAL)转换一个非数值字段: 含分隔符, 引号或换行时加引号, 引号写两次
+    :param value: 字段值
+    :return: 字段文本(str)
+    """
+    text = str(value)
+    if any(char in text for char in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def column_format(column):
+    """
+    选择一列数据的格式: 整数为 %d, 浮点数为 %r(与 csv.writer 相同的最短往返表示), 其余为 %s(值由 csv_field 转换)
+    :param column: 一列数据(np.array)
+    :return: 格式字符串
+    """
+    if np.issubdtype(column.dtype, np.integer) or np.issubdtype(column.dtype, np.bool_):
+        return '%d'
+    if np.issubdtype(column.dtype, np.floating):
+        return '%r'
+    return '%s'
+
+
+def column_template(column):
+    """
+    :param column: 一列数据(np.array), 0 维数组为每行相同的常量列
+    :return: 行模板中该列的部分: 常量列直接写入转换后的值, 其余为格式字符串
+    """
+    if column.ndim:
+        return column_format(column)
+    text = column_format(column) % column.item() if column_format(column) != '%s' else csv_field(column.item())
+    return text.replace('%', '%%')
+
+
+def column_rows(columns):
+    """
+    :param columns: 列数据列表(np.array), 可含 0 维的常量列
+    :return: 行数, 即非常量列的长度
+    """
+    return next((len(column) for column in columns if column.ndim), 1)
+
+
+def format_rows(columns):
+    """
+    将若干列数据格式化为CSV文本, 整块数据只调用一次 % 格式化, 不逐行调用 csv.writer.
+    0 维数组为常量列(如文件路径), 直接写入行模板, 不展开为整列; 非数值列与 csv.writer 一样按需加引号
+    :param columns: 等长的列数据列表(np.array)
+    :return: CSV文本(str), 每行以 LINE_TERMINATOR 结尾
+    """
+    import itertools
+    rows = column_rows(columns)
+    row_format = ','.join(column_template(column) for column in columns) + LINE_TERMINATOR
+    # 按行交错各列的值, tolist 将 numpy 标量一次转换为 Python 数值
+    values = [column.tolist() if column_format(column) != '%s' else list(map(csv_field, column.tolist()))
+              for column in columns if column.ndim]
+    return (row_format * rows) % tuple(itertools.chain.from_iterable(zip(*values)))
+
+
+def record_dtype(columns, names=None):
+    """
+    :param columns: 列数据列表(np.array)
+    :param names: 列名列表, 默认为 f0, f1, ...
+    :return: 单列时为该列的类型, 多列时为结构化类型
+    """
+    if len(columns) == 1:
+        return columns[0].dtype
+    return np.dtype([(names[i] if names else f'f{i}', column.dtype) for i, column in enumerate(columns)])
+
+
+class ArrayWriter:
+    """
+    分块写入列数据: .npy 为可内存映射的数组(需预先给出总行数), .raw/.bin 为原始二进制, 其余为CSV文本.
+    单列时保存为一维数组, 多列时保存为结构化数组
+    """
+
+    def __init__(self, path, length=None, dtype=None, names=None, append=False):
+        """
+        :param path: 输出文件路径
+        :param length: 总行数, .npy 格式必须指定
+        :param dtype: 每行的类型(单列为元素类型, 多列为结构化类型), .npy 格式必须指定
+        :param names: 多列时的列名
+        :param append: CSV 格式时附加到文件末尾, 二进制格式总是覆写
+        """
+        import os
+        self.path, self.names, self.offset = path, names, 0
+        extension = os.path.splitext(path)[1].lower()
+        self.kind = 'npy' if extension in NPY_EXTENSIONS else 'raw' if extension in RAW_EXTENSIONS else 'csv'
+        if self.kind == 'npy':
+            if length is None or dtype is None:
+                raise ValueError('length and dtype are required to write .npy')
+            self.file = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(length,))
+        elif self.kind == 'raw':
+            self.file = open(path, 'wb')
+        else:
+            self.file = open(path, 'a' if append else 'w', newline='', buffering=BUFFER_SIZE)
+
+    def write(self, *columns, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        写入一批行
+        :param columns: 等长的列数据(np.array 或标量序列), 标量为每行相同的常量列
+        :param chunk_rows: CSV 格式时每次格式化的行数
+        :return: None
+        """
+        columns = [np.asarray(column) for column in columns]
+        rows = column_rows(columns)
+        if self.kind == 'csv':
+            for begin in range(0, rows, chunk_rows):
+                self.file.write(format_rows([column[begin:begin + chunk_rows] if column.ndim else column
+                                             for column in columns]))
+            return
+        # 二进制格式中常量列展开为整列
+        columns = [np.broadcast_to(column, (rows,)) for column in columns]
+        records = columns[0]
+        if len(columns) > 1:
+            records = np.empty(rows, dtype=record_dtype(columns, self.names))
+            for name, column in zip(records.dtype.names, columns):
+                records[name] = column
+        if self.kind == 'npy':
+            self.file[self.offset:self.offset + rows] = records
+        else:
+            records.tofile(self.file)
+        self.offset += rows
+
+    def close(self):
+        """
+        :return: None
+        """
+        if self.kind == 'npy':
+            self.file.flush()
+            del self.file
+        else:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def export_array(path, columns, names=None, append=False):
+    """
+    一次导出若干列数据, 格式由扩展名决定: .npy, .raw/.bin 或 CSV
+    :param path: 输出文件路径
+    :param columns: 等长的列数据列表(np.array), 标量为每行相同的常量列
+    :param names: 多列时的列名
+    :param append: CSV 格式时附加到文件末尾
+    :return: None
+    """
+    columns = [np.asarray(column) for column in columns]
+    with ArrayWriter(path, column_rows(columns), record_dtype(columns, names), names, append) as writer:
+        writer.write(*columns)
@@ -1,3 +1,4 @@
+import io
 import unittest
 import numpy as np
 import os
@@ -131,15 +132,9 @@ class ByteSourceTestCase(unittest.TestCase):
             :return: 二元DMS概率分布数组：numpy.array
             """
             # 统计总256个各个字符出现的总数
-            (hist, bin_edges) = np.histogram(msg, bins=range(257))
-            # 位总数为字符总数8倍
-            num_bits = msg.size * 8
-            # 计算位1, 0出现的数量
-            num_1 = sum(hist[i]*bin(i).count('1') for i in range(256))
-            num_0 = num_bits - num_1
-            # 计算位1, 0的概率
-            prob_0, prob_1 = num_0 / num_bits, num_1 / num_bits
-            return np.array([prob_0, prob_1])
+            hist = np.bincount(msg, minlength=256)
+            # 通过查找表得到位0, 1出现的数量, 并计算其概率
+            return calcInfo.count_to_probability(calcInfo.sub_byte_count(hist, 1))
 
         # 测试1：位1的概率为0.5, 扩展后应为256字符等概率分布, 信息长度为102400bytes, 概率及信息熵允许最大相对误差分别为0.2, 0.1
         test_p_true, test_path = 0.5, 'test.dat'
@@ -165,6 +160,171 @@ class ByteSourceTestCase(unittest.TestCase):
         # 测试完毕移除测试文件
         os.remove(test_path)
 
+    def test_gen_byte_source(self):
+        """
+        分块生成信源的单元测试: 相同种子的输出与块大小无关
+        :return: None
+        """
+        symbol_cumsum = byteSource.CDF(byteSource.read_as_probability_distribution('input/PDF.byte.uniform.csv'))
+        # 一次生成全部符号作为参照
+        expected = byteSource.gen_msg_arr(symbol_cumsum, byteSource.rand_arr(100000, np.random.default_rng(42)))
+        for chunk_size in [1000, 4096, 100000, 1 << 20]:
+            byteSource.gen_byte_source('test.dat', symbol_cumsum, 100000, seed=42, chunk_size=chunk_size)
+            self.assertTrue(np.array_equal(expected, np.fromfile('test.dat', dtype=np.uint8)))
+        # 别名采样同样与块大小无关
+        alias_tables = byteSource.alias_table(np.diff(symbol_cumsum, prepend=0))
+        expected = byteSource.gen_msg_arr_alias(*alias_tables, byteSource.rand_bits(100000, np.random.default_rng(42)))
+        for chunk_size in [999, 4096, 1 << 20]:
+            byteSource.gen_byte_source('test.dat', symbol_cumsum, 100000, seed=42, chunk_size=chunk_size,
+                                       alias_tables=alias_tables)
+            self.assertTrue(np.array_equal(expected, np.fromfile('test.dat', dtype=np.uint8)))
+        # 多进程生成: 输出对给定的 (seed, workers) 可复现, 每段与单独生成的对应段一致
+        byteSource.gen_byte_source('test.dat', symbol_cumsum, 100001, seed=42, chunk_size=4096, workers=3)
+        parallel = np.fromfile('test.dat', dtype=np.uint8)
+        self.assertEqual(100001, parallel.size)
+        byteSource.gen_byte_source('test.dat', symbol_cumsum, 100001, seed=42, chunk_size=999, workers=3)
+        self.assertTrue(np.array_equal(parallel, np.fromfile('test.dat', dtype=np.uint8)))
+        seeds = np.random.SeedSequence(42).spawn(3)
+        self.assertTrue(np.array_equal(parallel[33333:66667], byteSource.gen_msg_arr(
+            symbol_cumsum, byteSource.rand_arr(33334, np.random.default_rng(seeds[1])))))
+        # 随机数数组与生成信源所用的一致
+        byteSource.gen_byte_source('test.dat', symbol_cumsum, 1000, seed=42, chunk_size=300, rand_path='test.csv')
+        self.assertTrue(np.allclose(byteSource.rand_arr(1000, np.random.default_rng(42)),
+                                    np.loadtxt('test.csv', delimiter=',')))
+        os.remove('test.dat')
+        os.remove('test.csv')
+
+    def test_gen_msg_arr_alias(self):
+        """
+        别名采样的单元测试: 与累积概率分布采样的统计结果一致
+        :return: None
+        """
+        rng = np.random.default_rng(7)
+        for prob in [np.full(256, 1 / 256), rng.random(256) ** 4, np.array([1 if n == 3 else 0 for n in range(256)]),
+                     np.array([0.5 if n <= 1 else 0 for n in range(256)])]:
+            prob = prob / prob.sum()
+            alias_threshold, alias = byteSource.alias_table(prob)
+            # 别名表中每个符号的总概率与理论概率一致
+            table_prob = np.bincount(np.arange(256), alias_threshold / (1 << byteSource.ALIAS_BITS), 256) + \
+                np.bincount(alias, 1 - alias_threshold / (1 << byteSource.ALIAS_BITS), 256)
+            self.assertTrue(np.allclose(prob * 256, table_prob, atol=1e-6))
+            # 概率为 0 的符号不会出现
+            msg = byteSource.gen_msg_arr_alias(alias_threshold, alias, byteSource.rand_bits(1000000, rng))
+            self.assertTrue(np.all(prob[msg] > 0))
+            # 两种采样方法的信息熵相对误差均在允许范围内
+            msg_cdf = byteSource.gen_msg_arr(byteSource.CDF(prob), byteSource.rand_arr(1000000, rng))
+            msg_entropy = calcInfo.entropy(calcInfo.probability(msg))
+            self.assertErrorIsAllowed(calcInfo.entropy(prob), msg_entropy, 1e-3)
+            self.assertErrorIsAllowed(calcInfo.entropy(calcInfo.probability(msg_cdf)), msg_entropy, 1e-3)
+            # 频数与理论概率的卡方统计量不超过 256 个自由度下的临界值(显著性水平约 1e-6)
+            observed, expected = np.bincount(msg, minlength=256), prob * msg.size
+            self.assertLess(np.sum((observed - expected)[expected > 0] ** 2 / expected[expected > 0]), 400)
+
+    def test_extended_source(self):
+        """
+        n次扩展信源的单元测试: Kronecker积与逐符号计算一致, 直接生成的信源符合扩展信源的概率分布
+        :return: None
+        """
+        p_true = 0.2
+        prob = byteSource.extended_source_prob([1 - p_true, p_true], 8)
+        ones = np.unpackbits(np.arange(256, dtype=np.uint8).reshape(-1, 1), axis=1).sum(axis=1)
+        self.assertTrue(np.allclose(p_true ** ones * (1 - p_true) ** (8 - ones), prob, rtol=1e-15, atol=0))
+        # 三元信源的2次扩展, 第一个符号为最高位
+        ternary = byteSource.extended_source_prob([0.5, 0.3, 0.2], 2)
+        self.assertAlmostEqual(0.3 * 0.2, ternary[1 * 3 + 2])
+        self.assertAlmostEqual(calcInfo.entropy(np.array([0.5, 0.3, 0.2])) * 2, calcInfo.entropy(ternary))
+        # 保存的概率分布文件读入后逐位相同
+        byteSource.generate_bDMS_extended_source_prob_file(p_true, 'test.csv')
+        self.assertTrue(np.array_equal(prob, byteSource.read_as_probability_distribution('test.csv')))
+        os.remove('test.csv')
+        # 直接生成的信源与块大小无关, 且信息熵与理论一致
+        byteSource.gen_bDMS_extended_source('test.dat', p_true, 1 << 20, seed=3)
+        msg = np.fromfile('test.dat', dtype=np.uint8)
+        byteSource.gen_bDMS_extended_source('test.dat', p_true, 1 << 20, seed=3, chunk_size=1000)
+        self.assertTrue(np.array_equal(msg, np.fromfile('test.dat', dtype=np.uint8)))
+        os.remove('test.dat')
+        self.assertErrorIsAllowed(calcInfo.entropy(prob), calcInfo.entropy(calcInfo.probability(msg)), 1e-3)
+        # 概率不是 2^-8 的整数倍时不做舍入, 以及概率为 0 与 1 的边界
+        for p_true in [0.5 + 0.5 / 256, 0, 1]:
+            byteSource.gen_bDMS_extended_source('test.dat', p_true, 1 << 20, seed=5)
+            self.assertAlmostEqual(p_true, np.unpackbits(np.fromfile('test.dat', dtype=np.uint8)).mean(), places=3)
+        os.remove('test.dat')
+
+    def test_gen_markov_byte_source(self):
+        """
+        马尔可夫信源的单元测试: 分段并行生成与逐个符号顺序生成一致, 转移频率符合状态转移矩阵
+        :return: None
+        """
+        rng = np.random.default_rng(11)
+        # 稀疏的随机转移矩阵, 以及轨迹难以汇合的带状转移矩阵
+        band = sum(np.roll(np.eye(256), shift, axis=1) for shift in (-1, 0, 1))
+        for transition in [rng.dirichlet(np.full(256, 0.05), 256), band / 3]:
+            markov_tables = byteSource.markov_alias_tables(transition)
+            symbol_bits = byteSource.rand_bits(3001, rng)
+            state, expected = np.uint8(5), []
+            for bits in symbol_bits:
+                state = byteSource.markov_step(markov_tables, state, bits)
+                expected.append(state)
+            for lanes in [1, 7, 64]:
+                self.assertTrue(np.array_equal(expected, byteSource.gen_markov_msg_arr(markov_tables, 5, symbol_bits,
+                                                                                       lanes)))
+        np.save('test.npy', transition)
+        markov_tables = byteSource.markov_alias_tables(byteSource.read_transition_matrix('test.npy'))
+        os.remove('test.npy')
+        # 输出与块大小无关
+        byteSource.gen_markov_byte_source('test.dat', markov_tables, 1 << 16, seed=2)
+        msg = np.fromfile('test.dat', dtype=np.uint8)
+        byteSource.gen_markov_byte_source('test.dat', markov_tables, 1 << 16, seed=2, chunk_size=10000)
+        self.assertTrue(np.array_equal(msg, np.fromfile('test.dat', dtype=np.uint8)))
+        os.remove('test.dat')
+        # 只出现带内的转移, 且条件信息熵与理论值 log2(3) 一致
+        self.assertTrue(np.all(band[msg[:-1], msg[1:]] > 0))
+        counters = calcInfo.stream_ngram_count(io.BytesIO(msg.tobytes()), 2)
+        self.assertErrorIsAllowed(np.log2(3), calcInfo.conditional_entropies(counters)[1][1], 1e-2)
+        # 轨迹几乎不汇合的 ±1 随机游走: 1 MiB 在限定时间内生成, 且与极小的块大小结果一致
+        import time
+        walk = (np.roll(np.eye(256), -1, axis=1) + np.roll(np.eye(256), 1, axis=1)) / 2
+        markov_tables = byteSource.markov_alias_tables(walk)
+        begin = time.perf_counter()
+        byteSource.gen_markov_byte_source('test.dat', markov_tables, 1 << 20, seed=4)
+        msg = np.fromfile('test.dat', dtype=np.uint8)
+        byteSource.gen_markov_byte_source('test.dat', markov_tables, 1 << 20, seed=4, chunk_size=999)
+        self.assertLess(time.perf_counter() - begin, 20)
+        self.assertTrue(np.array_equal(msg, np.fromfile('test.dat', dtype=np.uint8)))
+        os.remove('test.dat')
+        self.assertTrue(np.all(walk[msg[:-1], msg[1:]] > 0))
+
+    def test_compiled_distribution(self):
+        """
+        编译概率分布的单元测试: 归一化, 缓存复用与内容改变后重新编译
+        :return: None
+        """
+        import shutil
+        # 未归一化的概率分布
+        byteSource.save_as_probability_distribution('test.csv', np.arange(256) * 2.)
+        table = byteSource.load_compiled_distribution('test.csv', 'test/dist_cache')
+        self.assertTrue(np.allclose(np.arange(256) / np.arange(256).sum(), table['prob']))
+        self.assertEqual(1, table['cdf'][-1])
+        self.assertTrue(np.array_equal(byteSource.alias_table(table['prob'])[1], table['alias']))
+        # 内容不变时以内存映射方式读入缓存
+        cached = byteSource.load_compiled_distribution('test.csv', 'test/dist_cache')
+        self.assertIsInstance(cached, np.memmap)
+        self.assertTrue(np.array_equal(table, cached))
+        byteSource.save_as_probability_distribution('test.csv', np.full(256, 1 / 256))
+        table = byteSource.load_compiled_distribution('test.csv', 'test/dist_cache')
+        self.assertTrue(np.allclose(1 / 256, table['prob']))
+        self.assertEqual(2, len(os.listdir('test/dist_cache')))
+        del cached
+        shutil.rmtree('test/dist_cache')
+        # 缓存目录不可写时仍返回编译结果
+        with self.assertLogs(level='WARNING'):
+            table = byteSource.load_compiled_distribution('test.csv', 'test.csv/dist_cache')
+        self.assertTrue(np.allclose(1 / 256, table['prob']))
+        os.remove('test.csv')
+        # 非法的概率分布
+        for symbol_prob in [np.zeros(256), np.full(256, -1.), np.full(255, 1.), np.full(256, np.nan)]:
+            self.assertRaises(ValueError, byteSource.compile_distribution, symbol_prob)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
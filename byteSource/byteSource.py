@@ -1,5 +1,20 @@
+import os
+
 import numpy as np
 
+# 分块生成信源时每块的默认符号数, 决定了生成过程中的峰值内存
+DEFAULT_CHUNK_SIZE = 1 << 20
+# 别名采样时, 每个 uint32 随机数的高 8 位选择列, 低 24 位与该列的阈值比较
+ALIAS_BITS = 24
+# 编译后的概率分布: 每个符号一条记录, 含归一化概率, 累积概率与别名表
+COMPILED_DTYPE = np.dtype([('prob', '<f8'), ('cdf', '<f8'), ('threshold', '<u4'), ('alias', 'u1')])
+# 马尔可夫信源每块并行推进的链段数
+MARKOV_LANES = 4096
+# 马尔可夫信源并行修正起始状态的最多轮数, 之后逐段顺序修正
+MARKOV_REPAIR_PASSES = 4
+# 马尔可夫信源每块的最少符号数
+MARKOV_MIN_CHUNK = 1 << 18
+
 
 # noinspection PyPep8Naming
 def CDF(symbol_prob):
@@ -12,13 +27,16 @@ def CDF(symbol_prob):
     return symbol_prob.cumsum()
 
 
-def rand_arr(size):
+def rand_arr(size, rng=None):
     """
     生成[0,1]区间均匀分布的随机实数f
     :param size: 随机实数数组大小
+    :param rng: 随机数生成器:numpy.random.Generator, 默认使用 np.random 的全局状态
     :return: 随机实数数组f:numpy.array
     """
-    return np.random.uniform(size=size)
+    if rng is None:
+        return np.random.uniform(size=size)
+    return rng.random(size)
 
 
 def gen_msg_arr(symbol_cumsum, symbol_random):
@@ -60,6 +78,239 @@ def gen_msg_arr(symbol_cumsum, symbol_random):
     return np.array(np.searchsorted(symbol_cumsum, symbol_random), dtype='uint8')
 
 
+def alias_table(symbol_prob):
+    """
+    按 Walker/Vose 别名方法构造 256 列的采样表, 每列以阈值概率取本列符号, 否则取该列的别名
+    :param symbol_prob: 概率分布数组:numpy.array
+    :return: (阈值数组:numpy.array(uint32, 以 2^ALIAS_BITS 为 1), 别名数组:numpy.array(uint8))
+    """
+    # 将概率缩放为平均值 1, 每列的总概率为 1/256
+    scaled = np.asarray(symbol_prob, dtype=float) * 256 / np.sum(symbol_prob)
+    threshold, alias = np.ones(256), np.arange(256, dtype=np.uint8)
+    small = [i for i in range(256) if scaled[i] < 1]
+    large = [i for i in range(256) if scaled[i] >= 1]
+    # 每次用一个概率大于 1 的符号补满一个概率小于 1 的列
+    while small and large:
+        less, more = small.pop(), large.pop()
+        threshold[less], alias[less] = scaled[less], more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+    # 剩余的列只受浮点误差影响, 阈值为 1
+    return np.round(threshold * (1 << ALIAS_BITS)).astype(np.uint32), alias
+
+
+def rand_bits(size, rng=None):
+    """
+    生成均匀分布的 uint32 随机整数, 别名采样每个符号只需一个
+    :param size: 随机整数数组大小
+    :param rng: 随机数生成器:numpy.random.Generator, 默认使用 np.random 的全局状态
+    :return: 随机整数数组:numpy.array(uint32)
+    """
+    if rng is None:
+        return np.random.randint(0, 1 << 32, size=size, dtype=np.uint32)
+    return rng.integers(0, 1 << 32, size=size, dtype=np.uint32)
+
+
+def gen_msg_arr_alias(alias_threshold, alias, symbol_bits):
+    """
+    根据别名表和 uint32 随机整数数组生成信源数组, 每个符号只需 O(1) 次查表
+    :param alias_threshold: 阈值数组:numpy.array(uint32)
+    :param alias: 别名数组:numpy.array(uint8)
+    :param symbol_bits: 随机整数数组:numpy.array(uint32)
+    :return: 信源数组:numpy.array(uint8)
+    """
+    # 高 8 位等概率地选择一列
+    column = (symbol_bits >> ALIAS_BITS).astype(np.uint8)
+    # 低 24 位小于该列阈值时取本列符号, 否则取别名
+    return np.where(symbol_bits & ((1 << ALIAS_BITS) - 1) < alias_threshold[column], column, alias[column])
+
+
+def read_transition_matrix(path):
+    """
+    读入马尔可夫信源的 256x256 状态转移矩阵, 第 i 行为前一个符号为 i 时下一个符号的概率分布, 每行归一化
+    :param path: 转移矩阵文件路径, .npy 格式或逗号分隔的CSV格式
+    :return: 状态转移矩阵:numpy.array
+    """
+    transition = np.load(path) if path.endswith('.npy') else np.loadtxt(path, delimiter=',', ndmin=2)
+    transition = np.asarray(transition, dtype=float)
+    if transition.shape != (256, 256):
+        raise ValueError(f'Transition matrix must be 256x256, got {transition.shape}')
+    if not np.all(np.isfinite(transition)) or np.any(transition < 0) or np.any(transition.sum(axis=1) <= 0):
+        raise ValueError('Transition matrix rows must be non-negative with a positive sum')
+    return transition / transition.sum(axis=1, keepdims=True)
+
+
+def markov_alias_tables(transition):
+    """
+    为每个状态(前一个符号)构造一张别名表
+    :param transition: 状态转移矩阵:numpy.array
+    :return: (阈值矩阵:numpy.array(uint32, 256x256), 别名矩阵:numpy.array(uint8, 256x256))
+    """
+    tables = [alias_table(row) for row in transition]
+    return np.array([threshold for threshold, _ in tables]), np.array([alias for _, alias in tables])
+
+
+def markov_step(markov_tables, state, symbol_bits):
+    """
+    按各自状态的别名表, 由 uint32 随机整数得到下一个符号, state 与 symbol_bits 按广播规则对应
+    :param markov_tables: markov_alias_tables 返回的 (阈值矩阵, 别名矩阵)
+    :param state: 当前符号数组:numpy.array(uint8)
+    :param symbol_bits: 随机整数数组:numpy.array(uint32)
+    :return: 下一个符号数组:numpy.array(uint8)
+    """
+    thresholds, aliases = markov_tables
+    column = (symbol_bits >> ALIAS_BITS).astype(np.uint8)
+    return np.where(symbol_bits & ((1 << ALIAS_BITS) - 1) < thresholds[state, column], column,
+                    aliases[state, column])
+
+
+def transpose_tiled(matrix, tile=256):
+    """
+    分块转置二维数组, 每次转置 tile 行, 比整体转置的缓存命中率高
+    :param matrix: 二维数组:numpy.array
+    :param tile: 每块的行数
+    :return: 转置后的连续数组:numpy.array
+    """
+    result = np.empty(matrix.shape[::-1], dtype=matrix.dtype)
+    for begin in range(0, matrix.shape[0], tile):
+        result[:, begin:begin + tile] = matrix[begin:begin + tile].T
+    return result
+
+
+def markov_packed_table(markov_tables):
+    """
+    将每个状态的别名表压缩为一张按 状态*256+列 索引的 uint32 表, 高 24 位为阈值, 低 8 位为别名,
+    每步只需一次查表. 阈值为 2^ALIAS_BITS 的列总是取本列符号, 压缩为阈值 2^ALIAS_BITS-1 且别名为本列, 结果不变
+    :param markov_tables: markov_alias_tables 返回的 (阈值矩阵, 别名矩阵)
+    :return: 压缩的别名表:numpy.array(uint32, 65536)
+    """
+    thresholds, aliases = markov_tables
+    full = thresholds >= 1 << ALIAS_BITS
+    aliases = np.where(full, np.arange(256, dtype=np.uint8), aliases).astype(np.uint32)
+    thresholds = np.minimum(thresholds, (1 << ALIAS_BITS) - 1).astype(np.uint32)
+    return ((thresholds << 8) | aliases).ravel()
+
+
+def markov_walk(table, state, starts, columns, keys, msg):
+    """
+    按顺序逐段修正并行推进的马尔可夫链: 起始状态猜错的段从正确的起始状态逐个符号重新推进, 与原轨迹汇合后其余符号不再改变
+    :param table: markov_packed_table 返回的压缩别名表:list
+    :param state: 第一段第一个符号之前的状态(符号)
+    :param starts: 每段推进时使用的起始状态:list
+    :param columns: 按 (段, 步) 排列的随机整数高 8 位:list
+    :param keys: 按 (段, 步) 排列的与压缩表比较的键:list
+    :param msg: 按 (段, 步) 排列的各段原来的符号:list, 原地修改
+    :return: 修正后的符号:list
+    """
+    length = len(msg) // len(starts)
+    for begin, start in zip(range(0, len(msg), length), starts):
+        if start != state:
+            for index in range(begin, begin + length):
+                entry = table[(state << 8) | columns[index]]
+                state = columns[index] if keys[index] < entry else entry & 0xff
+                if msg[index] == state:
+                    break
+                msg[index] = state
+        # 下一段的起始状态为本段修正后的结束状态
+        state = msg[begin + length - 1]
+    return msg
+
+
+def gen_markov_msg_arr(markov_tables, state, symbol_bits, lanes=MARKOV_LANES):
+    """
+    根据每个状态的别名表和随机整数数组生成马尔可夫信源数组, 第 i 个符号由第 i-1 个符号和第 i 个随机整数决定,
+    结果与逐个符号(markov_step)顺序生成完全相同.
+    将数组等分为 lanes 段, 先猜测每段的起始状态并同时推进所有段, 再用前一段的结束状态修正后一段的起始状态,
+    重新推进起始状态改变的段, 直到与原轨迹汇合. 对于容易汇合的转移矩阵只需很少几轮;
+    对于几乎确定的转移(如置换, 带状矩阵)轨迹难以汇合, 每轮只多修正约一段, 因此最多修正 MARKOV_REPAIR_PASSES 轮,
+    剩余的段按顺序逐段修正(markov_walk), 速度退化为逐个符号的 Python 循环
+    :param markov_tables: markov_alias_tables 返回的 (阈值矩阵, 别名矩阵)
+    :param state: 第一个符号之前的状态(符号)
+    :param symbol_bits: 随机整数数组:numpy.array(uint32)
+    :param lanes: 并行推进的段数
+    :return: 信源数组:numpy.array(uint8)
+    """
+    table = markov_packed_table(markov_tables)
+    lanes = max(1, min(lanes, symbol_bits.size))
+    length = -(-symbol_bits.size // lanes)
+    # 按 (步, 段) 连续排列随机整数, 最后一段不足的部分补 0, 补齐的符号最后丢弃
+    bits = np.zeros(lanes * length, dtype=np.uint32)
+    bits[:symbol_bits.size] = symbol_bits
+    bits = transpose_tiled(bits.reshape(lanes, length))
+    # 高 8 位为列, 低 24 位左移 8 位并补 0xff 后与压缩表直接比较: key < entry 当且仅当 低 24 位 < 阈值
+    columns = bits >> ALIAS_BITS
+    keys = np.left_shift(bits, 8, out=bits)
+    keys |= 0xff
+    # 第一段的起始状态已知, 其余各段先猜测为同一状态; 全部使用 uint32, 每步只有原地的逐元素运算与一次查表
+    starts = np.full(lanes, state, dtype=np.uint32)
+    msg = np.empty((length, lanes), dtype=np.uint32)
+    index, entry, take = np.empty(lanes, dtype=np.uint32), np.empty(lanes, dtype=np.uint32), \
+        np.empty(lanes, dtype=np.uint32)
+    msg[-1] = starts
+    for step in range(length):
+        # 以上一步的符号为状态, 第 0 步的 msg[-1] 即为起始状态
+        np.left_shift(msg[step - 1], 8, out=index)
+        index |= columns[step]
+        np.take(table, index, out=entry)
+        np.less(keys[step], entry, out=take, casting='unsafe')
+        # 符号 = 别名 ^ ((列 ^ 别名) * take), 避免按掩码选择
+        symbol = msg[step]
+        np.bitwise_and(entry, 0xff, out=symbol)
+        np.bitwise_xor(symbol, columns[step], out=entry)
+        entry *= take
+        symbol ^= entry
+    for _ in range(MARKOV_REPAIR_PASSES):
+        # 每段的起始状态应为前一段的结束状态
+        expected = np.concatenate([[state], msg[-1, :-1]]).astype(np.uint32)
+        changed = np.flatnonzero(expected != starts)
+        if not changed.size:
+            break
+        starts[changed] = expected[changed]
+        current = starts[changed]
+        for step in range(length):
+            column = columns[step, changed]
+            entry = table[(current << 8) | column]
+            current = np.where(keys[step, changed] < entry, column, entry & 0xff)
+            # 与原轨迹汇合后, 该段剩余的符号不再改变
+            merged = msg[step, changed] == current
+            msg[step, changed] = current
+            changed, current = changed[~merged], current[~merged]
+            if not changed.size:
+                break
+    else:
+        # 轨迹难以汇合时每轮只多修正约一段, 剩余的段按顺序逐段修正
+        msg = markov_walk(table.tolist(), int(state), starts.tolist(), columns.T.ravel().tolist(),
+                          keys.T.ravel().tolist(), transpose_tiled(msg).ravel().tolist())
+        return np.array(msg, dtype=np.uint8)[:symbol_bits.size]
+    return transpose_tiled(msg.astype(np.uint8)).ravel()[:symbol_bits.size]
+
+
+def gen_markov_byte_source(path, markov_tables, msg_len, state=0, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    分块生成马尔可夫信源数据并将每块直接写入文件, 每个符号消耗一个 uint32 随机数,
+    给定 seed 时输出与块大小无关, 逐字节可复现
+    :param path: 保存路径
+    :param markov_tables: markov_alias_tables 返回的 (阈值矩阵, 别名矩阵)
+    :param msg_len: 信源数据个数
+    :param state: 第一个符号之前的状态(符号)
+    :param seed: 随机数种子, 默认使用系统熵源
+    :param chunk_size: 每块的符号数, 至少为 MARKOV_MIN_CHUNK
+    :return: None
+    """
+    rng = np.random.default_rng(seed)
+    # 每块都要重建压缩表并启动各段, 块过小时固定开销占主导
+    chunk_size = max(chunk_size, MARKOV_MIN_CHUNK)
+    # 以覆写模式打开文件
+    with open(path, 'w+b') as byte_source_file:
+        for offset in range(0, msg_len, chunk_size):
+            msg = gen_markov_msg_arr(markov_tables, state, rand_bits(min(chunk_size, msg_len - offset), rng))
+            byte_source_file.write(msg)
+            # 下一块从本块的最后一个符号继续
+            state = msg[-1]
+        byte_source_file.flush()
+    byte_source_file.close()
+
+
 def save_as_byte_source(path, byte_source):
     """
     将信源数组保存到指定路径
@@ -74,6 +325,83 @@ def save_as_byte_source(path, byte_source):
     byte_source_file.close()
 
 
+def gen_byte_source_segment(path, begin, length, symbol_cumsum, seed=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                            rand_path=None, alias_tables=None):
+    """
+    分块生成一段信源数据, 写入已存在的文件中 [begin, begin+length) 的位置
+    :param path: 保存路径, 文件必须已存在
+    :param begin: 本段在文件中的起始位置
+    :param length: 本段的信源数据个数
+    :param symbol_cumsum: 累积概率分布数组:numpy.array
+    :param seed: 随机数种子(int 或 numpy.random.SeedSequence), 默认使用系统熵源
+    :param chunk_size: 每块的符号数
+    :param rand_path: 若指定, 将随机数数组保存到该文件(.npy, .raw/.bin 或CSV)
+    :param alias_tables: 若指定 alias_table 返回的 (阈值数组, 别名数组), 使用别名方法代替累积概率分布采样
+    :return: None
+    """
+    import arrayExport
+    rng = np.random.default_rng(seed)
+    # 以读写模式打开文件, 只覆写本段的数据
+    with open(path, 'r+b') as byte_source_file:
+        byte_source_file.seek(begin)
+        rand_file = arrayExport.ArrayWriter(rand_path, length, np.uint32 if alias_tables else np.float64) \
+            if rand_path else None
+        try:
+            for offset in range(0, length, chunk_size):
+                # Step 2: 生成本块的在[0,1]之间均匀分布的随机实数f(别名采样时为 uint32 随机整数)
+                size = min(chunk_size, length - offset)
+                symbol_random = rand_bits(size, rng) if alias_tables else rand_arr(size, rng)
+                if rand_file:
+                    rand_file.write(symbol_random)
+                # Step 3: 生成本块的消息符号并写入文件
+                byte_source_file.write(gen_msg_arr_alias(*alias_tables, symbol_random) if alias_tables else
+                                       gen_msg_arr(symbol_cumsum, symbol_random))
+        finally:
+            if rand_file:
+                rand_file.close()
+        byte_source_file.flush()
+    byte_source_file.close()
+
+
+def gen_byte_source(path, symbol_cumsum, msg_len, seed=None, chunk_size=DEFAULT_CHUNK_SIZE, rand_path=None,
+                    alias_tables=None, workers=None):
+    """
+    分块生成信源数据并将每块直接写入文件, 峰值内存只与块大小有关
+    随机数生成器每个符号消耗一个随机数, 给定 seed 时输出与块大小无关, 逐字节可复现
+    指定 workers 时, 将信源数据等分为 workers 段, 每段使用 SeedSequence(seed).spawn 派生的独立随机数流,
+    在多个进程中并行生成并写入文件中互不重叠的位置, 输出对给定的 (seed, workers) 可复现
+    :param path: 保存路径
+    :param symbol_cumsum: 累积概率分布数组:numpy.array
+    :param msg_len: 信源数据个数
+    :param seed: 随机数种子, 默认使用系统熵源
+    :param chunk_size: 每块的符号数
+    :param rand_path: 若指定, 将随机数数组保存到该文件(.npy, .raw/.bin 或CSV, 仅单进程生成时)
+    :param alias_tables: 若指定 alias_table 返回的 (阈值数组, 别名数组), 使用别名方法代替累积概率分布采样
+    :param workers: 并行生成的进程数, 0 表示使用全部CPU核心, 默认在当前进程中生成单个随机数流
+    :return: None
+    """
+    import os
+    # 以覆写模式创建文件, 并预先分配完整的大小
+    with open(path, 'w+b') as byte_source_file:
+        byte_source_file.truncate(msg_len)
+    byte_source_file.close()
+    if workers is None:
+        gen_byte_source_segment(path, 0, msg_len, symbol_cumsum, seed, chunk_size, rand_path, alias_tables)
+        return
+    if rand_path:
+        raise ValueError('rand_path is not supported with workers')
+    workers = workers or os.cpu_count()
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    bounds = np.linspace(0, msg_len, workers + 1).astype(np.int64).tolist()
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(gen_byte_source_segment, path, bounds[i], bounds[i + 1] - bounds[i],
+                                   symbol_cumsum, seeds[i], chunk_size, None, alias_tables) for i in range(workers)]
+        # 等待所有段生成完毕, 并抛出其中的异常
+        for future in futures:
+            future.result()
+
+
 def read_as_probability_distribution(path):
     """
     从CSV文件中读入概率分布数组
@@ -92,6 +420,33 @@ def read_as_probability_distribution(path):
     return symbol_probability
 
 
+def extended_source_prob(symbol_prob, n):
+    """
+    计算q元离散无记忆信源的n次扩展信源的概率分布, 即n个概率分布数组的Kronecker积
+    扩展符号的编码以q为基数, 第一个符号为最高位, 如二元信源的8次扩展中, 第一个位为字节的最高位
+    :param symbol_prob: q元信源的概率分布数组:numpy.array
+    :param n: 扩展次数
+    :return: 长度为q^n的概率分布数组:numpy.array
+    """
+    symbol_prob = np.asarray(symbol_prob, dtype=float)
+    prob = np.ones(1)
+    # 每次外积使编码左移一位并加上新的符号
+    for _ in range(n):
+        prob = np.multiply.outer(prob, symbol_prob).ravel()
+    return prob
+
+
+def save_as_probability_distribution(path, symbol_prob):
+    """
+    将概率分布数组保存为 read_as_probability_distribution 可读入的CSV文件, 以 %.17g 保存完整的双精度
+    :param path: CSV文件路径
+    :param symbol_prob: 概率分布数组:numpy.array
+    :return: None
+    """
+    np.savetxt(path, np.column_stack([np.arange(np.size(symbol_prob)), symbol_prob]),
+               fmt=['"%d"', '"%.17g"'], delimiter=',')
+
+
 def generate_bDMS_extended_source_prob_file(p_true, path):
     """
     输出二元离散无记忆信源的8次扩展信源的概率分布文件, csv格式
@@ -99,27 +454,111 @@ def generate_bDMS_extended_source_prob_file(p_true, path):
     :param path: CSV文件路径
     :return: None
     """
-    prob = np.array([p_true**(bin(i).count('1'))*(1-p_true)**(8-bin(i).count('1')) for i in range(256)])
-    with open(path, 'w') as p_file:
-        for i in range(prob.size):
-            p_file.write('"%d","%g"\n' % (i, prob[i]))
-        p_file.close()
+    save_as_probability_distribution(path, extended_source_prob([1 - p_true, p_true], 8))
 
 
-def save_as_csv(path, data):
+def gen_bDMS_extended_source(path, p_true, msg_len, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
     """
-    将数据保存到指定路径的CSV文件当中
-    :param path: CSV文件路径
-    :param data: 要保存的数据
+    直接生成二元离散无记忆信源的8次扩展信源: 按伯努利分布生成位, 每8位打包为一个字节(第一个位为最高位),
+    无需在256元累积概率分布中查找. 每个位只消耗一个 8 位随机整数 u, 与 p_true*2^8 的整数部分比较,
+    相等时(概率 2^-8)再用另一个随机数生成器的实数 v 与小数部分比较, 等价于 (u+v)/2^8 < p_true, 与 p_true 不做舍入.
+    给定 seed 时输出与块大小无关, 逐字节可复现
+    :param path: 保存路径
+    :param p_true: 二元离散无记忆信源中1的概率
+    :param msg_len: 信源数据(字节)个数
+    :param seed: 随机数种子, 默认使用系统熵源
+    :param chunk_size: 每块的字节数
     :return: None
     """
-    import csv
+    # 两个独立的随机数流: 逐位的 8 位随机整数, 以及按位置顺序消耗的相等时的随机实数
+    rng, tie_rng = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(2)]
+    scaled = p_true * (1 << 8)
+    # p_true 为 1 时整数部分取 2^8-1, 小数部分为 1, 相等时总是为1
+    threshold = min(int(scaled), (1 << 8) - 1)
+    fraction = scaled - threshold
     # 以覆写模式打开文件
-    with open(path, 'w', newline='') as csv_file:
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerows(data)
-        csv_file.flush()
+    with open(path, 'w+b') as byte_source_file:
+        for offset in range(0, msg_len, chunk_size):
+            size = min(chunk_size, msg_len - offset)
+            # 每个 64 位原始随机数拆分为 8 个 8 位随机整数, 恰好生成一个字节
+            draws = rng.bit_generator.random_raw(size).view(np.uint8)
+            bits = draws < threshold
+            ties = np.flatnonzero(draws == threshold)
+            bits[ties] = tie_rng.random(ties.size) < fraction
+            byte_source_file.write(np.packbits(bits))
+        byte_source_file.flush()
+    byte_source_file.close()
+
+
+def compile_distribution(symbol_prob):
+    """
+    校验并归一化概率分布, 预先计算累积概率分布与别名表
+    :param symbol_prob: 概率分布数组:numpy.array
+    :return: 编译后的概率分布:numpy.array(COMPILED_DTYPE, 256 条记录)
+    """
+    symbol_prob = np.asarray(symbol_prob, dtype=float)
+    if symbol_prob.shape != (256,) or not np.all(np.isfinite(symbol_prob)) or np.any(symbol_prob < 0) \
+            or symbol_prob.sum() <= 0:
+        raise ValueError('Probability distribution must be 256 non-negative finite values with a positive sum')
+    table = np.zeros(256, dtype=COMPILED_DTYPE)
+    table['prob'] = symbol_prob / symbol_prob.sum()
+    table['cdf'] = CDF(table['prob'])
+    # 消除舍入误差, 保证 [0,1) 中的随机实数都落在某个符号中
+    table['cdf'][-1] = 1
+    table['threshold'], table['alias'] = alias_table(table['prob'])
+    return table
+
+
+def load_compiled_distribution(path, cache_dir=None):
+    """
+    读入编译后的概率分布. 以CSV文件内容的 sha256 为键缓存为 .npy 文件, 内容不变时直接以内存映射方式读入,
+    不再逐行解析CSV
+    :param path: 概率分布CSV文件路径
+    :param cache_dir: 缓存目录, 默认为CSV文件所在目录下的 .dist_cache, 不可写时只记录警告
+    :return: 编译后的概率分布:numpy.array(COMPILED_DTYPE)
+    """
+    import hashlib
+    import logging
+    import os
+    with open(path, 'rb') as csv_file:
+        key = hashlib.sha256(csv_file.read()).hexdigest()
     csv_file.close()
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), '.dist_cache')
+    compiled_path = os.path.join(cache_dir, key + '.npy')
+    if os.path.exists(compiled_path):
+        try:
+            table = np.load(compiled_path, mmap_mode='r')
+            if table.dtype == COMPILED_DTYPE and table.shape == (256,):
+                return table
+        except (OSError, ValueError):
+            pass
+    table = compile_distribution(read_as_probability_distribution(path))
+    # 先写临时文件再替换, 并发的任务不会读到不完整的文件
+    temp_path = f'{compiled_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(temp_path, 'wb') as compiled_file:
+            np.save(compiled_file, table)
+        compiled_file.close()
+        os.replace(temp_path, compiled_path)
+    except OSError as error:
+        # 缓存目录不可写(如只读目录)时不缓存, 直接使用编译结果
+        logging.warning(f'Can not cache compiled distribution in {cache_dir}: {error}')
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return table
+
+
+def save_as_csv(path, data):
+    """
+    将二维数据按列保存到指定路径, 以 .npy, .raw/.bin 结尾时保存为二进制数组, 否则为CSV文件
+    :param path: 文件路径
+    :param data: 要保存的数据, 每行一条记录
+    :return: None
+    """
+    import arrayExport
+    data = np.asarray(data)
+    arrayExport.export_array(path, [data[:, column] for column in range(data.shape[1])])
 
 
 def parse_args():
@@ -141,13 +580,41 @@ def parse_args():
                         help='log level set to [logging.DEBUG]')
     # -F <CDF_CSV> - 输出累积概率分布数组到指定文件, CSV格式
     parser.add_argument('-F', '--CDF_CSV', action='store', nargs=1,
-                        help='Save CDF array to file, in CSV format')
+                        help='Save CDF array to file, in CSV format (.npy or .raw/.bin for binary)')
     # -R <RAND_CSV> - 输出随机数数组到指定文件, CSV格式
     parser.add_argument('-R', '--RAND_CSV', action='store', nargs=1,
-                        help='Save random array to file, in CSV format')
+                        help='Save random array to file, in CSV format (.npy or .raw/.bin for binary)')
     # -e 输出二元离散无记忆信源的8次扩展信源的概率分布文件, csv格式
     parser.add_argument('-e', '--prob_and_path', metavar='p_true path',
                         help='takes two arguments: probability of true and the path of the file to be saved', nargs=2)
+    # -X <PROB_CSV> <N> <PATH> 输出q元离散无记忆信源的n次扩展信源的概率分布文件, csv格式
+    parser.add_argument('-X', '--extend', metavar=('PROB_CSV', 'N', 'PATH'), nargs=3,
+                        help='save the N-th extension of the q-ary source in PROB_CSV to PATH, q^N must not exceed 256')
+    # -B <p_true> <path> <msg_len> 按伯努利分布直接生成二元离散无记忆信源的8次扩展信源
+    parser.add_argument('-B', '--bernoulli', metavar=('p_true', 'path', 'msg_len'), nargs=3,
+                        help='generate the 8th extension of a binary source directly from packed Bernoulli bits')
+    # --seed <SEED> - 随机数种子, 相同的种子产生逐字节相同的信源数据
+    parser.add_argument('--seed', type=int,
+                        help='seed of the random generator, output is reproducible for a given seed')
+    # --chunk_size <N> - 分块生成时每块的符号数
+    parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='symbols generated and written per chunk, bounds the peak memory')
+    # --sampler <cdf|alias> - 采样方法: 累积概率分布二分查找, 或 O(1) 的别名方法
+    parser.add_argument('-s', '--sampler', choices=['cdf', 'alias'], default='cdf',
+                        help='sample symbols by binary search over the CDF, or by an O(1) alias table')
+    # --workers <N> - 并行生成的进程数
+    parser.add_argument('-w', '--workers', type=int,
+                        help='generate N independent seeded streams in parallel processes, 0 for all cores')
+    # -m - 按马尔可夫信源生成, INPUT 为状态转移矩阵
+    parser.add_argument('-m', '--markov', action='store_true',
+                        help='INPUT is a 256x256 transition matrix (CSV or .npy), generate a Markov chain source')
+    # --dist_cache <DIR> - 编译后的概率分布的缓存目录
+    parser.add_argument('--dist_cache', metavar='DIR',
+                        help='cache of compiled distributions keyed by the INPUT content hash, '
+                             'default .dist_cache next to INPUT')
+    # --no_dist_cache - 不使用编译后的概率分布, 每次解析CSV
+    parser.add_argument('--no_dist_cache', action='store_true',
+                        help='parse INPUT and build the CDF on every run, without normalising')
     # -t - 运行测试
     parser.add_argument('-t', '--test', action="store_true",
                         help='run tests')
@@ -167,6 +634,22 @@ def parse_args():
             parser.error('p_true must be in interval of [0, 1]')
         generate_bDMS_extended_source_prob_file(float(p_true), extended_prob_path)
 
+    # 输出q元离散无记忆信源的n次扩展信源的概率分布文件
+    if args.extend:
+        prob_path, n, extended_prob_path = args.extend
+        # 信源的符号数q为概率不为0的最大符号加1
+        symbol_prob = np.trim_zeros(read_as_probability_distribution(prob_path), 'b')
+        if int(n) < 1 or symbol_prob.size ** int(n) > 256:
+            parser.error('N must be positive and q^N must not exceed 256')
+        save_as_probability_distribution(extended_prob_path, extended_source_prob(symbol_prob, int(n)))
+
+    # 按伯努利分布直接生成二元离散无记忆信源的8次扩展信源
+    if args.bernoulli:
+        p_true, bernoulli_path, bernoulli_len = args.bernoulli
+        if 0 > float(p_true) or 1 < float(p_true):
+            parser.error('p_true must be in interval of [0, 1]')
+        gen_bDMS_extended_source(bernoulli_path, float(p_true), int(bernoulli_len), args.seed, args.chunk_size)
+
     if args.test:
         logging.info('Begin Unit Test')
         import subprocess
@@ -177,30 +660,49 @@ def parse_args():
             return
         parser.error('Missing required argument(s)[INPUT, OUTPUT, MSG_LEN]')
 
-    # 从指定路径读入概率分布P
-    logging.debug(f'Read Probability from:{args.INPUT}')
-    symbol_prob = read_as_probability_distribution(args.INPUT)
-    # Step 1: 计算累积概率分布F
-    logging.debug('Evaluating CDF')
-    symbol_cumsum = CDF(symbol_prob)
+    if args.workers is not None and args.RAND_CSV:
+        parser.error('Option(-R) can not be used with -w/--workers')
+
+    if args.markov:
+        if args.CDF_CSV or args.RAND_CSV or args.workers is not None:
+            parser.error('Option(-F, -R, -w) can not be used with -m/--markov')
+        # 读入状态转移矩阵, 为每个状态预先构造别名表
+        logging.debug(f'Read transition matrix from:{args.INPUT}')
+        markov_tables = markov_alias_tables(read_transition_matrix(args.INPUT))
+        logging.debug('Generating Markov byte source')
+        gen_markov_byte_source(args.OUTPUT, markov_tables, args.MSG_LEN, seed=args.seed, chunk_size=args.chunk_size)
+        return
+
+    if args.no_dist_cache:
+        # 从指定路径读入概率分布P
+        logging.debug(f'Read Probability from:{args.INPUT}')
+        symbol_prob = read_as_probability_distribution(args.INPUT)
+        # Step 1: 计算累积概率分布F
+        logging.debug('Evaluating CDF')
+        symbol_cumsum = CDF(symbol_prob)
+        alias_tables = alias_table(symbol_prob) if args.sampler == 'alias' else None
+    else:
+        # 读入编译后的概率分布, 其中已包含归一化的概率分布P, 累积概率分布F与别名表
+        logging.debug(f'Load compiled probability of:{args.INPUT}')
+        table = load_compiled_distribution(args.INPUT, args.dist_cache)
+        symbol_cumsum = np.ascontiguousarray(table['cdf'])
+        alias_tables = (np.ascontiguousarray(table['threshold']), np.ascontiguousarray(table['alias'])) \
+            if args.sampler == 'alias' else None
     # 保存累积概率分布到文件中
     if args.CDF_CSV:
         save_as_csv(args.CDF_CSV[0], symbol_cumsum.reshape([symbol_cumsum.size, 1]))
         logging.info(f'Saved CDF data to:{args.CDF_CSV[0]}')
-    # Step 2: 生成MSG_LEN个在[0,1]之间均匀分布的随机实数f
-    logging.debug('Generating Rand array')
-    symbol_random = rand_arr(args.MSG_LEN)
-    # 保存随机数数组到文件中
+    # Step 2, 3: 分块生成随机实数f与消息符号, 并直接保存到文件中
+    logging.debug('Generating byte source')
+    gen_byte_source(args.OUTPUT, symbol_cumsum, args.MSG_LEN, args.seed, args.chunk_size,
+                    args.RAND_CSV[0] if args.RAND_CSV else None, alias_tables, args.workers)
     if args.RAND_CSV:
-        save_as_csv(args.RAND_CSV[0], symbol_random.reshape([symbol_random.size, 1]))
         logging.info(f'Saved Rand data to:{args.RAND_CSV[0]}')
-    # Step 3: 生成消息符号
-    logging.debug('Generating byte source')
-    byte_source = gen_msg_arr(symbol_cumsum, symbol_random)
-    # 保存信源数据到文件中
-    save_as_byte_source(args.OUTPUT, byte_source)
 
 
 if __name__ == '__main__':
+    import sys
+    # 作为脚本运行时, 与 calcInfo 共用的导出模块 arrayExport 位于上级目录
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     parse_args()
 
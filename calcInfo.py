@@ -3,6 +3,52 @@ import timeit
 import numpy as np
 import csv
 
+import arrayExport
+
+# 分块读取文件时每块的默认大小(字节), 决定了计算过程中的峰值内存
+DEFAULT_CHUNK_SIZE = 1 << 20
+# 计算多元组信息熵时支持的最大阶数
+MAX_ORDER = 4
+# 计数缓存目录的默认大小上限(字节)
+DEFAULT_CACHE_SIZE = 64 << 20
+# 抽样估计信息熵时的默认块大小(字节), 每轮抽取的块数与自助法重抽样次数
+DEFAULT_SAMPLE_SIZE, DEFAULT_SAMPLE_BLOCKS, DEFAULT_RESAMPLES = 4096, 64, 200
+# 字节直方图二进制格式的文件头: 魔数与版本号
+HISTOGRAM_MAGIC, HISTOGRAM_VERSION = b'BHST', 1
+# 支持的符号宽度(bit)
+SYMBOL_WIDTHS = (1, 2, 4, 8, 16, 32)
+# 压缩包成员的结果行中, 压缩包路径与成员名之间的分隔符
+ARCHIVE_MEMBER_SEPARATOR = '!'
+# 跟踪文件时用于识别轮转的文件开头字节数
+HEAD_SIZE = 64
+# 不超过该阶数时使用 256^k 的稠密计数数组(3 阶为 128 MiB), 更高阶使用稀疏计数
+DENSE_ORDER = 3
+# 以 SQLite 结果库保存结果的扩展名
+RESULT_STORE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+# 结果库等待写锁的默认时间(秒)与汇总计数时每次读取的行数
+DEFAULT_STORE_TIMEOUT, DEFAULT_STORE_BATCH = 60, 1024
+
+
+def byte_count(arr):
+    """
+    统计每个符号出现的次数, 将字节作为符号划分单位
+    :param arr: 字节数组(np.array)
+    :return: 符号计数数组(np.array)
+    """
+    # 由于一个字节(byte)能表示 0-255 共 256 个符号, 所以计数数组长度为 256
+    # np.bincount 直接对整数计数, 避免 np.histogram 的浮点区间查找
+    return np.bincount(arr, minlength=256)
+
+
+def count_to_probability(counts):
+    """
+    通过符号计数数组计算符号出现的概率
+    :param counts: 符号计数数组(np.array)
+    :return: 符号概率数组(np.array)
+    """
+    # 区间宽度均为 1, 与 np.histogram(density=True) 的结果逐位一致
+    return counts / counts.sum()
+
 
 def probability(arr):
     """
@@ -10,9 +56,8 @@ def probability(arr):
     :param arr: 字节数组(np.array)
     :return: 符号概率数组(np.array)
     """
-    # 由于一个字节(byte)能表示 0-256 个符号, 所以区间为 (0, 257)
-    # 返回在 0-256 区间内, 每个符号的出现的概率的数组
-    return np.histogram(arr, bins=range(0, 257), density=True)[0]
+    # 返回在 0-255 区间内, 每个符号的出现的概率的数组
+    return count_to_probability(byte_count(arr))
 
 
 def self_info(p_arr, out=None):
@@ -32,8 +77,112 @@ def entropy(p_arr):
     :param p_arr: 符号概率数组(np.array)
     :return: 信息熵
     """
-    # 计算信息熵
-    return np.sum(p_arr * self_info(p_arr))
+    # 计算信息熵, 概率为 0 的符号的自信息量记为 0, 避免未初始化的值参与求和
+    return np.sum(p_arr * self_info(p_arr, np.zeros(np.shape(p_arr))))
+
+
+def count_entropy(counts):
+    """
+    通过符号计数数组计算信息熵, 最后一维为符号, 可一次计算多个计数数组的信息熵
+    :param counts: 符号计数数组(np.array), 形状为 (..., 符号数)
+    :return: 信息熵(np.array), 形状为 (...)
+    """
+    totals = counts.sum(axis=-1, keepdims=True)
+    # 空计数数组的信息熵记为 0
+    p_arr = counts / np.where(totals, totals, 1)
+    return np.sum(p_arr * self_info(p_arr, np.zeros(p_arr.shape)), axis=-1)
+
+
+def xlogx(arr):
+    """
+    逐元素计算 x*log2(x), 约定 0*log2(0) = 0
+    :param arr: 数组(np.array)
+    :return: 数组(np.array)
+    """
+    return arr * np.log2(arr, where=arr > 0, out=np.zeros(np.shape(arr)))
+
+
+def cross_entropy_matrix(p_mat, q_mat):
+    """
+    一次计算 N 个概率分布对 M 个参考分布的交叉熵 H(p, q) = -sum(p*log2(q)), 以矩阵乘法完成
+    :param p_mat: 概率分布矩阵(np.array), 形状为 (N, 256)
+    :param q_mat: 参考分布矩阵(np.array), 形状为 (M, 256)
+    :return: 交叉熵矩阵(np.array), 形状为 (N, M), p 出现而 q 中概率为 0 的符号使交叉熵为 inf
+    """
+    log_q = np.log2(q_mat, where=q_mat > 0, out=np.zeros(np.shape(q_mat)))
+    result = -(p_mat @ log_q.T)
+    # 概率为 0 的符号的对数记为 0 后, 另用一次矩阵乘法找出不可能编码的符号
+    result[((p_mat > 0).astype(float) @ (q_mat == 0).T.astype(float)) > 0] = np.inf
+    return result
+
+
+def kl_divergence_matrix(p_mat, q_mat):
+    """
+    一次计算 N 个概率分布对 M 个参考分布的 KL 散度 D(p||q) = H(p, q) - H(p)
+    :param p_mat: 概率分布矩阵(np.array), 形状为 (N, 256)
+    :param q_mat: 参考分布矩阵(np.array), 形状为 (M, 256)
+    :return: KL 散度矩阵(np.array), 形状为 (N, M)
+    """
+    # 舍入误差可能使相同分布的 KL 散度略小于 0
+    return np.maximum(cross_entropy_matrix(p_mat, q_mat) + xlogx(p_mat).sum(axis=1, keepdims=True), 0)
+
+
+def js_divergence_matrix(p_mat, block=256, threads=1):
+    """
+    计算 N 个概率分布两两之间的 Jensen-Shannon 散度矩阵(bit, 取值 [0, 1]).
+    JS(p, q) = 1 - C/2, C = sum(g(p+q) - g(p) - g(q)), g(x) = x*log2(x), 只有 p, q 都不为 0 的符号对 C 有贡献.
+    按 block x block 分块计算上三角, 每块中逐符号向量化; 稀疏的符号只计算两者都不为 0 的子矩阵.
+    np.log2 会释放 GIL, 各块可在多个线程中并行计算
+    :param p_mat: 概率分布矩阵(np.array), 形状为 (N, 256)
+    :param block: 分块大小
+    :param threads: 线程数, 0 表示使用全部CPU核心
+    :return: JS 散度矩阵(np.array), 形状为 (N, N)
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    p_mat = np.asarray(p_mat, dtype=float)
+    size = p_mat.shape[0]
+    g_mat, active = xlogx(p_mat), p_mat > 0
+    result = np.empty((size, size))
+
+    def tile(begin_row, begin_col):
+        rows, cols = slice(begin_row, begin_row + block), slice(begin_col, begin_col + block)
+        p_rows, p_cols, rows_active, cols_active = p_mat[rows], p_mat[cols], active[rows], active[cols]
+        acc = np.zeros((p_rows.shape[0], p_cols.shape[0]))
+        pair_sum, pair_log = np.empty_like(acc), np.empty_like(acc)
+        dense = []
+        for symbol in np.flatnonzero(rows_active.any(axis=0) & cols_active.any(axis=0)):
+            row_index, col_index = np.flatnonzero(rows_active[:, symbol]), np.flatnonzero(cols_active[:, symbol])
+            if 2 * row_index.size * col_index.size > acc.size:
+                # 稠密的符号: 整块计算 g(p+q), 复用缓冲区, g(p) 与 g(q) 在循环后统一减去
+                dense.append(symbol)
+                np.add(p_rows[:, symbol, None], p_cols[None, :, symbol], out=pair_sum)
+                np.log2(np.maximum(pair_sum, np.finfo(float).tiny, out=pair_log), out=pair_log)
+                pair_log *= pair_sum
+                acc += pair_log
+            else:
+                p, q = p_rows[row_index, symbol], p_cols[col_index, symbol]
+                acc[np.ix_(row_index, col_index)] += xlogx(p[:, None] + q[None, :]) - \
+                    xlogx(p)[:, None] - xlogx(q)[None, :]
+        acc -= g_mat[rows][:, dense].sum(axis=1)[:, None] + g_mat[cols][:, dense].sum(axis=1)[None, :]
+        # 舍入误差可能使结果略超出 [0, 1]
+        values = np.clip(1 - acc / 2, 0, 1)
+        if begin_row == begin_col:
+            # 稀疏路径的 g(p+q)-g(p)-g(q) 在浮点运算中不对称, 对角块取上三角并镜像到下三角
+            values = np.triu(values) + np.triu(values, 1).T
+        else:
+            result[cols, rows] = values.T
+        result[rows, cols] = values
+
+    tiles = [(begin_row, begin_col) for begin_row in range(0, size, block)
+             for begin_col in range(begin_row, size, block)]
+    if not tiles:
+        return result
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as executor:
+        # 取出结果以抛出其中的异常
+        list(executor.map(tile, *zip(*tiles)))
+    np.fill_diagonal(result, 0)
+    return result
 
 
 def open_file_as_binary_array(path):
@@ -46,6 +195,1168 @@ def open_file_as_binary_array(path):
     return np.fromfile(path, dtype=np.uint8)
 
 
+def open_file_as_memmap(path):
+    """
+    将文件以只读模式映射为字节数组, 数据按需从磁盘读入
+    :param path: 文件路径
+    :return: 字节数组(np.memmap)
+    """
+    import os
+    # 空文件无法映射
+    if not os.path.getsize(path):
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def block_byte_count(arr, block_size):
+    """
+    统计每个长度为 block_size 的不重叠块中每个符号出现的次数, 末尾不足一块的数据被忽略
+    :param arr: 字节数组(np.array)
+    :param block_size: 块大小(字节)
+    :return: 符号计数矩阵(np.array), 形状为 (块数, 256)
+    """
+    blocks = np.asarray(arr[:arr.size // block_size * block_size]).reshape(-1, block_size)
+    # 为第 i 块的符号加上 256*i 的偏移, 一次 bincount 即可得到所有块的计数
+    offsets = np.arange(blocks.shape[0], dtype=np.intp).reshape(-1, 1) * 256
+    return np.bincount((blocks + offsets).ravel(), minlength=blocks.shape[0] * 256).reshape(-1, 256)
+
+
+def window_byte_count(arr, block_size, stride):
+    """
+    统计每个长度为 block_size, 起始位置间隔为 stride 的窗口中每个符号出现的次数
+    :param arr: 字节数组(np.array)
+    :param block_size: 窗口大小(字节)
+    :param stride: 相邻窗口起始位置的间隔(字节)
+    :return: 符号计数矩阵(np.array), 形状为 (窗口数, 256)
+    """
+    if block_size == stride:
+        return block_byte_count(arr, block_size)
+    # 对所有窗口的零拷贝视图直接计数
+    windows = np.lib.stride_tricks.sliding_window_view(np.asarray(arr), block_size)[::stride]
+    offsets = np.arange(windows.shape[0], dtype=np.intp).reshape(-1, 1) * 256
+    return np.bincount((windows + offsets).ravel(), minlength=windows.shape[0] * 256).reshape(-1, 256)
+
+
+def entropy_profile(arr, block_size, stride=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    计算信息熵剖面: 每个长度为 block_size, 起始位置间隔为 stride 的窗口的信息熵
+    :param arr: 字节数组(np.array 或 np.memmap)
+    :param block_size: 窗口大小(字节)
+    :param stride: 相邻窗口起始位置的间隔(字节), 默认等于窗口大小, 即不重叠的块
+    :param chunk_size: 每批处理的数据量(字节), 决定了计算过程中的峰值内存
+    :return: (窗口起始位置数组(np.array), 信息熵数组(np.array))
+    """
+    stride = stride or block_size
+    num_windows = (arr.size - block_size) // stride + 1 if arr.size >= block_size else 0
+    entropies = np.empty(num_windows)
+    offsets = np.arange(num_windows, dtype=np.int64) * stride
+    if not num_windows:
+        return offsets, entropies
+    if stride >= block_size:
+        # 窗口互不重叠, 直接对每个窗口计数, 每个窗口需展开 block_size 个符号与若干 256 项的计数数组
+        batch = max(1, chunk_size // (block_size * 8 + 256 * 8 * 4))
+        for begin in range(0, num_windows, batch):
+            end = min(begin + batch, num_windows)
+            segment = arr[begin * stride:(end - 1) * stride + block_size]
+            entropies[begin:end] = count_entropy(window_byte_count(segment, block_size, stride))
+        return offsets, entropies
+    # 重叠的窗口: 保留当前窗口的计数, 窗口每移动一次只加上进入的 stride 字节并减去离开的 stride 字节,
+    # 每个字节最多被计数两次, 与 block_size/stride 无关
+    counts = np.zeros(256, dtype=np.int64)
+    for begin in range(0, block_size, chunk_size):
+        counts += byte_count(np.asarray(arr[begin:min(begin + chunk_size, block_size)]))
+    # 每个窗口需展开 2*stride 个符号与若干 256 项的计数数组
+    batch = max(1, chunk_size // (stride * 16 + 256 * 8 * 8))
+    for begin in range(0, num_windows, batch):
+        end = min(begin + batch, num_windows)
+        # 第 j 次移动: 加上 [j*stride+block_size, (j+1)*stride+block_size), 减去 [j*stride, (j+1)*stride)
+        moves = min(end, num_windows - 1) - begin
+        deltas = block_byte_count(arr[begin * stride + block_size:(begin + moves) * stride + block_size], stride)
+        deltas -= block_byte_count(arr[begin * stride:(begin + moves) * stride], stride)
+        np.cumsum(deltas, axis=0, out=deltas)
+        window_counts = np.empty((end - begin, 256), dtype=np.int64)
+        window_counts[0] = 0
+        window_counts[1:] = deltas[:end - begin - 1]
+        window_counts += counts
+        entropies[begin:end] = count_entropy(window_counts)
+        # 下一批的第一个窗口
+        if moves == end - begin:
+            counts += deltas[-1]
+    return offsets, entropies
+
+
+def save_entropy_profile(path, input_path, offsets, entropies):
+    """
+    保存信息熵剖面, 以 .npy 结尾时保存为二进制数组, 否则将 [文件路径, 起始位置, 信息熵] 附加到CSV文件
+    :param path: 剖面文件路径
+    :param input_path: 被计算的文件路径
+    :param offsets: 窗口起始位置数组(np.array)
+    :param entropies: 信息熵数组(np.array)
+    :return: None
+    """
+    if path.endswith('.npy'):
+        arrayExport.export_array(path, [offsets.astype('<i8'), entropies.astype('<f8')], ['offset', 'entropy'])
+        return
+    # 文件路径为常量列, 直接写入行模板
+    arrayExport.export_array(path, [input_path, offsets, entropies], append=True)
+
+
+def miller_madow_entropy(counts):
+    """
+    使用 Miller-Madow 偏差修正估计信息熵: H + (m - 1) / (2N ln2), m 为出现过的符号数, N 为符号总数
+    :param counts: 符号计数数组(np.array), 形状为 (..., 256), 可一次估计多个计数数组
+    :return: 信息熵估计值(np.array), 形状为 (...)
+    """
+    totals = counts.sum(axis=-1)
+    observed = np.count_nonzero(counts, axis=-1)
+    return count_entropy(counts) + (observed - 1) / (2 * np.where(totals, totals, 1) * np.log(2))
+
+
+def sample_block_count(arr, block_size, num_blocks, rng):
+    """
+    随机选取 num_blocks 个长度为 block_size 的块并分别计数, 对 np.memmap 只读取被选中的块
+    :param arr: 字节数组(np.array 或 np.memmap)
+    :param block_size: 块大小(字节)
+    :param num_blocks: 块数
+    :param rng: 随机数生成器(np.random.Generator)
+    :return: 符号计数矩阵(np.array), 形状为 (块数, 256)
+    """
+    starts = rng.integers(0, arr.size - block_size + 1, num_blocks)
+    blocks = arr[starts.reshape(-1, 1) + np.arange(block_size)]
+    return block_byte_count(blocks.ravel(), block_size)
+
+
+def estimate_entropy(path, block_size=DEFAULT_SAMPLE_SIZE, num_blocks=DEFAULT_SAMPLE_BLOCKS, tolerance=None,
+                     max_blocks=None, confidence=0.95, resamples=DEFAULT_RESAMPLES, seed=None):
+    """
+    通过随机抽样的块估计文件的信息熵, 每个文件的读取量只与抽样块数有关
+    以块为单位做自助法(bootstrap)重抽样估计标准误差, 得到置信区间; 指定 tolerance 时, 每轮追加 num_blocks 个块,
+    直到置信区间宽度不超过 tolerance 或抽样块数达到 max_blocks
+    :param path: 文件路径
+    :param block_size: 块大小(字节)
+    :param num_blocks: 每轮抽取的块数
+    :param tolerance: 置信区间宽度的目标值(bit/byte), 默认只抽样一轮
+    :param max_blocks: 最多抽取的块数, 默认为 num_blocks 的 16 倍
+    :param confidence: 置信水平
+    :param resamples: 自助法重抽样次数
+    :param seed: 随机数种子
+    :return: (信息熵估计值, 置信区间下限, 置信区间上限, 读取的字节数)
+    """
+    from statistics import NormalDist
+    arr = open_file_as_memmap(path)
+    # 文件不比抽样量大时直接精确计算
+    if arr.size <= block_size * num_blocks:
+        file_entropy = entropy(count_to_probability(byte_count(arr)))
+        return file_entropy, file_entropy, file_entropy, arr.size
+    rng = np.random.default_rng(seed)
+    max_blocks = max_blocks or 16 * num_blocks
+    z_score = NormalDist().inv_cdf((1 + confidence) / 2)
+    counts = np.empty((0, 256), dtype=np.int64)
+    while True:
+        counts = np.concatenate((counts, sample_block_count(arr, block_size, num_blocks, rng)))
+        # 每次重抽样中每个块被选中的次数, 加权求和即得重抽样的总计数
+        picks = rng.integers(0, counts.shape[0], (resamples, counts.shape[0]))
+        picks += np.arange(resamples).reshape(-1, 1) * counts.shape[0]
+        weights = np.bincount(picks.ravel(), minlength=picks.size).reshape(resamples, counts.shape[0])
+        estimate = miller_madow_entropy(counts.sum(axis=0))
+        # 重抽样中重复的块会使估计值整体偏移, 只使用重抽样估计值的标准差构造以估计值为中心的正态区间
+        half_width = z_score * np.std(miller_madow_entropy(weights @ counts), ddof=1)
+        low, high = estimate - half_width, estimate + half_width
+        if tolerance is None or high - low <= tolerance or counts.shape[0] + num_blocks > max_blocks:
+            break
+    return float(estimate), float(low), float(high), counts.shape[0] * block_size
+
+
+def iter_binary_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE, length=None, stats=None):
+    """
+    以固定大小的块读取字节流, 所有块复用同一个缓冲区
+    :param stream: 支持 readinto 的二进制流
+    :param chunk_size: 每块的大小(字节)
+    :param length: 最多读取的字节数, 默认读到流末尾
+    :param stats: 若指定 PhaseStats, 将读取耗时记入 read 阶段
+    :return: 字节数组块的迭代器(np.array), 每一块仅在下一次迭代前有效
+    """
+    # 预先分配缓冲区, 读取过程中不再分配新的内存
+    buffer = np.empty(chunk_size, dtype=np.uint8)
+    while length is None or length > 0:
+        begin_time = timeit.default_timer()
+        size = stream.readinto(buffer if length is None or length >= chunk_size else buffer[:length])
+        if stats:
+            stats.add('read', timeit.default_timer() - begin_time, size or 0)
+        # 读到流末尾
+        if not size:
+            return
+        if length is not None:
+            length -= size
+        yield buffer[:size]
+
+
+def stream_byte_count(stream, chunk_size=DEFAULT_CHUNK_SIZE, length=None, stats=None, progress=None):
+    """
+    分块统计字节流中每个符号出现的次数
+    :param stream: 支持 readinto 的二进制流
+    :param chunk_size: 每块的大小(字节)
+    :param length: 最多读取的字节数, 默认读到流末尾
+    :param stats: 若指定 PhaseStats, 分别记录 read 与 count 阶段
+    :param progress: 若指定, 每块计数后以当前的符号计数数组调用
+    :return: 符号计数数组(np.array)
+    """
+    counts = np.zeros(256, dtype=np.int64)
+    # 逐块累加整数计数, 最后再统一转换为概率
+    for chunk in iter_binary_chunks(stream, chunk_size, length, stats):
+        begin_time = timeit.default_timer()
+        counts += byte_count(chunk)
+        if stats:
+            stats.add('count', timeit.default_timer() - begin_time, chunk.size)
+        if progress:
+            progress(counts)
+    return counts
+
+
+def is_stream_input(path):
+    """
+    判断输入是否只能顺序读取一次: - 表示标准输入, 以及命名管道, 字符设备等非普通文件
+    :param path: 输入路径
+    :return: bool
+    """
+    import os
+    import stat
+    return path == '-' or (os.path.exists(path) and not stat.S_ISREG(os.stat(path).st_mode)
+                           and not os.path.isdir(path))
+
+
+def open_input_stream(path):
+    """
+    以 只读-无缓冲 模式打开输入, 数据由 readinto 直接读入复用的缓冲区
+    :param path: 输入路径, - 表示标准输入
+    :return: 二进制流, 标准输入关闭时不关闭其文件描述符
+    """
+    import sys
+    if path == '-':
+        return open(sys.stdin.fileno(), 'rb', buffering=0, closefd=False)
+    return open(path, 'rb', buffering=0)
+
+
+def entropy_progress(interval):
+    """
+    构造进度回调: 每读取 interval 字节, 以当前计数在日志中输出一次部分信息熵
+    :param interval: 输出间隔(字节)
+    :return: 回调函数, 参数为当前的符号计数数组
+    """
+    import logging
+    next_size = [interval]
+
+    def report(counts):
+        size = int(counts.sum())
+        if size >= next_size[0]:
+            logging.info(f'Progress:{size} bytes, entropy:{entropy(count_to_probability(counts))} bit/byte')
+            next_size[0] = (size // interval + 1) * interval
+    return report
+
+
+def range_byte_count(path, begin, end, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    分块统计文件 [begin, end) 区间中每个符号出现的次数, 每次调用独立打开文件, 可在多个线程中同时调用
+    :param path: 文件路径
+    :param begin: 区间起始位置(字节)
+    :param end: 区间结束位置(字节)
+    :param chunk_size: 每块的大小(字节)
+    :return: 符号计数数组(np.array)
+    """
+    with open(path, 'rb', buffering=0) as file:
+        file.seek(begin)
+        return stream_byte_count(file, chunk_size, end - begin)
+
+
+def file_byte_count(path, chunk_size=DEFAULT_CHUNK_SIZE, threads=1, stats=None):
+    """
+    分块统计文件中每个符号出现的次数, 峰值内存只与块大小(及线程数)有关
+    :param path: 文件路径
+    :param chunk_size: 每块的大小(字节)
+    :param threads: 计数线程数, 0 表示使用全部CPU核心
+    :param stats: 若指定 PhaseStats, 顺序读取时分别记录 read 与 count 阶段, 多线程时读取与计数重叠, 整体记入 count
+    :return: 符号计数数组(np.array)
+    """
+    import os
+    threads = threads or os.cpu_count()
+    size = os.path.getsize(path) if threads > 1 else 0
+    # 单线程或文件不足两块时顺序读取
+    if size < 2 * chunk_size:
+        # 以 只读-无缓冲 模式打开文件, 数据直接读入复用的缓冲区
+        with open(path, 'rb', buffering=0) as file:
+            return stream_byte_count(file, chunk_size, stats=stats)
+    # 将文件划分为 threads 个连续区间, 读取与 np.bincount 均会释放 GIL, 各线程可并行计数
+    from concurrent.futures import ThreadPoolExecutor
+    begin_time = timeit.default_timer()
+    bounds = np.linspace(0, size, min(threads, size // chunk_size) + 1).astype(np.int64).tolist()
+    with ThreadPoolExecutor(max_workers=len(bounds) - 1) as executor:
+        partial_counts = list(executor.map(range_byte_count, [path] * (len(bounds) - 1), bounds[:-1], bounds[1:],
+                                           [chunk_size] * (len(bounds) - 1)))
+    if stats:
+        stats.add('count', timeit.default_timer() - begin_time, size)
+    # 整数计数的合并与顺序无关, 结果与顺序读取逐位一致
+    return np.sum(partial_counts, axis=0)
+
+
+def ngram_codes(arr, order):
+    """
+    将字节数组中所有重叠的 order 元组按小端序编码为整数, 使用零拷贝的跨步视图
+    :param arr: 字节数组(np.array)
+    :param order: 元组长度(1-4)
+    :return: 编码数组(np.array), 长度为 arr.size - order + 1
+    """
+    arr = np.ascontiguousarray(arr)
+    num = arr.size - order + 1
+    if num <= 0:
+        return np.empty(0, dtype=np.uint32)
+    if order == 1:
+        return arr
+    # 以 1 字节为步长的 uint16/uint32 视图, 第 i 个元素即为从第 i 个字节开始的元组
+    if order == 2:
+        return np.ndarray((num,), dtype='<u2', buffer=arr, strides=(1,))
+    if order == 4:
+        return np.ndarray((num,), dtype='<u4', buffer=arr, strides=(1,))
+    # 三元组: 用 uint32 视图读取并屏蔽最高字节, 最后一个三元组之后没有第 4 个字节, 单独编码
+    codes = np.empty(num, dtype=np.uint32)
+    np.bitwise_and(np.ndarray((num - 1,), dtype='<u4', buffer=arr, strides=(1,)), 0xFFFFFF, out=codes[:-1])
+    codes[-1] = int(arr[-3]) | int(arr[-2]) << 8 | int(arr[-1]) << 16
+    return codes
+
+
+def merge_sparse_count(keys, counts, other_keys, other_counts):
+    """
+    合并两个有序稀疏计数, 相同编码的计数相加. 用 searchsorted 定位另一段的编码, 不拼接后整体排序,
+    临时数组只与另一段的大小有关
+    :param keys: 有序编码数组(np.array)
+    :param counts: 计数数组(np.array)
+    :param other_keys: 另一个有序编码数组(np.array)
+    :param other_counts: 另一个计数数组(np.array)
+    :return: (有序编码数组, 计数数组)
+    """
+    position = np.searchsorted(keys, other_keys)
+    found = keys[np.minimum(position, keys.size - 1)] == other_keys if keys.size else \
+        np.zeros(other_keys.size, dtype=bool)
+    # 新编码插入到 position 之前, 插入后的位置需加上在它之前插入的新编码个数
+    new_position = position[~found]
+    target = new_position + np.arange(new_position.size)
+    merged_keys = np.empty(keys.size + target.size, dtype=keys.dtype)
+    merged_counts = np.empty(merged_keys.size, dtype=np.result_type(counts, other_counts))
+    old = np.ones(merged_keys.size, dtype=bool)
+    old[target] = False
+    merged_keys[old], merged_keys[target] = keys, other_keys[~found]
+    merged_counts[old], merged_counts[target] = counts, other_counts[~found]
+    # 已有的编码, 其位置之前(含同一位置)插入的新编码个数即为偏移
+    position = position[found]
+    merged_counts[position + np.searchsorted(new_position, position, side='right')] += other_counts[found]
+    return merged_keys, merged_counts
+
+
+def count_blocks_entropy(blocks):
+    """
+    通过分块给出的计数数组计算信息熵 H = log2(N) - sum(c*log2(c))/N, 临时数组只与单块的大小有关
+    :param blocks: 计数数组(np.array)的可迭代对象, 所有块合起来为全部符号的计数
+    :return: 信息熵
+    """
+    total, weighted = 0, 0.
+    for counts in blocks:
+        total += int(counts.sum())
+        weighted += float(xlogx(counts.astype(np.float64)).sum())
+    # 空计数的信息熵记为 0
+    return np.log2(total) - weighted / total if total else 0.
+
+
+class NgramCounter:
+    """
+    多元组计数器: 低阶使用稠密计数数组, 4 阶使用稀疏的有序 (编码, 计数) 段, 避免 256^4 的稠密表.
+    稀疏计数按编码的最高字节分为 256 个分区, 每个分区的有序段各自合并, 合并的临时数组只与分区大小有关
+    """
+
+    def __init__(self, order):
+        """
+        :param order: 元组长度(1-4)
+        """
+        self.order = order
+        if order <= DENSE_ORDER:
+            self.counts = np.zeros(256 ** order, dtype=np.int64)
+        else:
+            # 每个分区的稀疏计数由若干有序段组成, 按需合并
+            self.partitions = [[] for _ in range(256)]
+            # 已统计的元组数, 不超过 uint32 范围时每段的计数使用 uint32
+            self.size = 0
+
+    def update(self, codes):
+        """
+        累加一批元组编码的计数
+        :param codes: 元组编码数组(np.array)
+        :return: None
+        """
+        if self.order <= 2:
+            self.counts += np.bincount(codes, minlength=self.counts.size)
+        elif self.order <= DENSE_ORDER:
+            # 计数表较大时, 原地累加比每次 bincount 出一张新表更快
+            np.add.at(self.counts, codes, 1)
+        else:
+            self.size += codes.size
+            keys, counts = np.unique(codes, return_counts=True)
+            # 任一编码的计数不超过已统计的元组数
+            counts = counts.astype(np.uint32 if self.size < 1 << 32 else np.int64)
+            bounds = np.searchsorted(keys, np.arange(1, 256, dtype=np.uint32) << 24).tolist()
+            for runs, begin, end in zip(self.partitions, [0] + bounds, bounds + [keys.size]):
+                if begin == end:
+                    continue
+                # 复制出分区的部分, 不让整块的数组随某个分区的段一直保留
+                runs.append((keys[begin:end].copy(), counts[begin:end].copy()))
+                # 合并大小相近的有序段, 使总的合并代价为 O(n log n)
+                while len(runs) > 1 and runs[-2][0].size <= 2 * runs[-1][0].size:
+                    run_keys, run_counts = runs.pop()
+                    runs[-1] = merge_sparse_count(*runs[-1], run_keys, run_counts)
+
+    def count_blocks(self):
+        """
+        逐块给出所有元组的计数, 稠密计数每块 DEFAULT_CHUNK_SIZE 个, 稀疏计数每个分区一块(先将分区的有序段合并为一段)
+        :return: 计数数组(np.array)的生成器
+        """
+        if self.order <= DENSE_ORDER:
+            for begin in range(0, self.counts.size, DEFAULT_CHUNK_SIZE):
+                yield self.counts[begin:begin + DEFAULT_CHUNK_SIZE]
+            return
+        for runs in self.partitions:
+            while len(runs) > 1:
+                run_keys, run_counts = runs.pop()
+                runs[-1] = merge_sparse_count(*runs[-1], run_keys, run_counts)
+            if runs:
+                yield runs[0][1]
+
+    def total(self):
+        """
+        :return: 统计的元组总数
+        """
+        return sum(int(counts.sum()) for counts in self.count_blocks())
+
+    def entropy(self):
+        """
+        :return: 元组的联合信息熵 H(X1..Xk)
+        """
+        return count_blocks_entropy(self.count_blocks())
+
+
+def stream_ngram_count(stream, max_order, chunk_size=DEFAULT_CHUNK_SIZE, stats=None, progress=None,
+                       symbol_counters=None):
+    """
+    分块统计字节流中 1 到 max_order 阶所有重叠元组出现的次数, 跨块的元组只统计一次
+    :param stream: 支持 readinto 的二进制流
+    :param max_order: 最大阶数(1-4)
+    :param chunk_size: 每块的大小(字节)
+    :param stats: 若指定 PhaseStats, 分别记录 read 与 count 阶段
+    :param progress: 若指定, 每块计数后以当前的字节计数数组调用
+    :param symbol_counters: 若指定字典 {16: NgramCounter(2), 32: NgramCounter(4)}, 在同一次读取中
+                            累加对齐的 16 位与 32 位符号(小端序)的计数, 末尾不足一个符号的字节被忽略
+    :return: 各阶元组计数器的列表, 第 0 个即为字节计数
+    """
+    counters = [NgramCounter(order) for order in range(1, max_order + 1)]
+    # 缓冲区开头保留上一块末尾的字节: max_order-1 个用于统计跨块的元组, 3 个用于对齐到 4 字节的符号
+    keep = max(max_order - 1, 3 if symbol_counters is not None else 0)
+    buffer = np.empty(chunk_size + keep, dtype=np.uint8)
+    # start 为 buffer[0] 在流中的位置, aligned 为下一个未统计的 4 字节对齐符号的位置
+    carry, start, aligned = 0, 0, 0
+    while True:
+        begin_time = timeit.default_timer()
+        size = stream.readinto(buffer[carry:])
+        if stats:
+            stats.add('read', timeit.default_timer() - begin_time, size or 0)
+        if not size:
+            break
+        begin_time = timeit.default_timer()
+        data = buffer[:carry + size]
+        for counter in counters:
+            # 起始位置在 carry-order 之前的元组已经在上一块中统计过
+            counter.update(ngram_codes(data[max(carry - counter.order + 1, 0):], counter.order))
+        if symbol_counters is not None:
+            # 对齐到 4 字节的部分以零拷贝的 uint16/uint32 视图计数
+            begin = aligned - start
+            end = begin + (data.size - begin) // 4 * 4
+            symbol_counters[16].update(data[begin:end].view('<u2'))
+            symbol_counters[32].update(data[begin:end].view('<u4'))
+            aligned = start + end
+        if stats:
+            stats.add('count', timeit.default_timer() - begin_time, size)
+        if progress:
+            progress(counters[0].counts)
+        carry = min(keep, data.size)
+        buffer[:carry] = data[data.size - carry:]
+        start += data.size - carry
+    # 末尾剩余的完整 16 位符号
+    if symbol_counters is not None and start + carry - aligned >= 2:
+        symbol_counters[16].update(buffer[aligned - start:aligned - start + 2].view('<u2'))
+    return counters
+
+
+def file_ngram_count(path, max_order, chunk_size=DEFAULT_CHUNK_SIZE, stats=None, symbol_counters=None):
+    """
+    分块统计文件中 1 到 max_order 阶所有重叠元组出现的次数
+    :param path: 文件路径
+    :param max_order: 最大阶数(1-4)
+    :param chunk_size: 每块的大小(字节)
+    :param stats: 若指定 PhaseStats, 分别记录 read 与 count 阶段
+    :param symbol_counters: 若指定, 同时统计对齐的 16 位与 32 位符号, 见 stream_ngram_count
+    :return: 各阶元组计数器的列表, 第 0 个即为字节计数
+    """
+    with open(path, 'rb', buffering=0) as file:
+        return stream_ngram_count(file, max_order, chunk_size, stats, symbol_counters=symbol_counters)
+
+
+def conditional_entropies(counters):
+    """
+    通过各阶元组计数器计算块信息熵与条件信息熵 H(Xk|X1..Xk-1) = H(X1..Xk) - H(X1..Xk-1)
+    :param counters: 1 到 k 阶元组计数器的列表
+    :return: (块信息熵列表, 条件信息熵列表)
+    """
+    block_entropies = [counter.entropy() for counter in counters]
+    return block_entropies, list(np.diff(block_entropies, prepend=0))
+
+
+class ByteHistogram:
+    """
+    可合并的字节直方图: 保存 256 个符号的整数计数, 不同分片, 进程或机器上的计数可以精确合并
+    二进制格式: 魔数 BHST, 版本号(1 字节), 计数宽度(1 字节, 1/2/4/8), 256 个小端无符号整数
+    """
+
+    def __init__(self, counts=None):
+        """
+        :param counts: 符号计数数组(np.array), 默认全为 0
+        """
+        self.counts = np.zeros(256, dtype=np.int64) if counts is None else np.array(counts, dtype=np.int64)
+        if self.counts.shape != (256,):
+            raise ValueError('ByteHistogram requires 256 counts')
+
+    @classmethod
+    def from_array(cls, arr):
+        """
+        :param arr: 字节数组(np.array)
+        :return: 字节直方图(ByteHistogram)
+        """
+        return cls(byte_count(arr))
+
+    @classmethod
+    def from_file(cls, path, chunk_size=DEFAULT_CHUNK_SIZE, threads=1):
+        """
+        :param path: 文件路径
+        :param chunk_size: 每块的大小(字节)
+        :param threads: 计数线程数
+        :return: 字节直方图(ByteHistogram)
+        """
+        return cls(file_byte_count(path, chunk_size, threads))
+
+    def update(self, arr):
+        """
+        累加字节数组的计数
+        :param arr: 字节数组(np.array)
+        :return: self
+        """
+        self.counts += byte_count(arr)
+        return self
+
+    def merge(self, other):
+        """
+        :param other: 另一个字节直方图
+        :return: 两个直方图计数之和(ByteHistogram)
+        """
+        return ByteHistogram(self.counts + other.counts)
+
+    def subtract(self, other):
+        """
+        :param other: 包含于本直方图的字节直方图, 如数据集中的一个分片
+        :return: 两个直方图计数之差(ByteHistogram)
+        """
+        counts = self.counts - other.counts
+        if np.any(counts < 0):
+            raise ValueError('Subtracted histogram is not contained in this histogram')
+        return ByteHistogram(counts)
+
+    __add__, __sub__ = merge, subtract
+
+    def __eq__(self, other):
+        return isinstance(other, ByteHistogram) and np.array_equal(self.counts, other.counts)
+
+    def total(self):
+        """
+        :return: 符号总数
+        """
+        return int(self.counts.sum())
+
+    def probability(self):
+        """
+        :return: 符号概率数组(np.array)
+        """
+        return count_to_probability(self.counts)
+
+    def self_info(self):
+        """
+        :return: 自信息量数组(np.array), 未出现的符号记为 0
+        """
+        return self_info(self.probability(), np.zeros(256))
+
+    def entropy(self):
+        """
+        :return: 信息熵
+        """
+        return entropy(self.probability())
+
+    def dumps(self):
+        """
+        序列化为二进制, 计数宽度取能容纳最大计数的最小宽度
+        :return: bytes
+        """
+        width = next(width for width in (1, 2, 4, 8) if self.counts.max() < 1 << (8 * width))
+        return HISTOGRAM_MAGIC + bytes([HISTOGRAM_VERSION, width]) + self.counts.astype(f'<u{width}').tobytes()
+
+    @classmethod
+    def loads(cls, data):
+        """
+        :param data: dumps 的结果
+        :return: 字节直方图(ByteHistogram)
+        """
+        header_size = len(HISTOGRAM_MAGIC) + 2
+        if data[:len(HISTOGRAM_MAGIC)] != HISTOGRAM_MAGIC or data[len(HISTOGRAM_MAGIC)] != HISTOGRAM_VERSION:
+            raise ValueError('Not a byte histogram')
+        width = data[len(HISTOGRAM_MAGIC) + 1]
+        if width not in (1, 2, 4, 8) or len(data) != header_size + 256 * width:
+            raise ValueError('Corrupted byte histogram')
+        return cls(np.frombuffer(data, dtype=f'<u{width}', offset=header_size))
+
+    def save(self, path):
+        """
+        :param path: 直方图文件路径
+        :return: None
+        """
+        with open(path, 'wb') as histogram_file:
+            histogram_file.write(self.dumps())
+        histogram_file.close()
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: 直方图文件路径
+        :return: 字节直方图(ByteHistogram)
+        """
+        with open(path, 'rb') as histogram_file:
+            return cls.loads(histogram_file.read())
+
+
+class CountCache:
+    """
+    按文件标识 (路径, 大小, 修改时间[, 内容哈希]) 缓存字节计数的磁盘缓存, 每个文件对应目录中的一个 .npy 文件
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE, content_hash=False):
+        """
+        :param directory: 缓存目录
+        :param max_size: 缓存目录大小上限(字节), 超出时淘汰最久未使用的条目
+        :param content_hash: 是否将文件内容的哈希加入标识(需要读取整个文件)
+        """
+        import os
+        self.directory, self.max_size, self.content_hash = directory, max_size, content_hash
+        # 已写入的条目数, 常驻服务据此在写入后淘汰
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        计算文件标识对应的缓存键
+        :param path: 文件路径
+        :param chunk_size: 计算内容哈希时每块的大小(字节)
+        :return: 缓存键(str)
+        """
+        import hashlib
+        import os
+        stat = os.stat(path)
+        identity = hashlib.sha256(f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}'.encode())
+        if self.content_hash:
+            with open(path, 'rb', buffering=0) as file:
+                for chunk in iter_binary_chunks(file, chunk_size):
+                    identity.update(chunk)
+        return identity.hexdigest()
+
+    def load(self, key):
+        """
+        读取缓存的字节计数, 并更新条目的访问时间
+        :param key: 缓存键
+        :return: 符号计数数组(np.array), 未命中时返回 None
+        """
+        import os
+        path = os.path.join(self.directory, key + '.npy')
+        try:
+            counts = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return counts
+
+    def save(self, key, counts):
+        """
+        写入字节计数, 先写临时文件再替换, 多个进程或线程同时写入也不会读到不完整的条目
+        :param key: 缓存键
+        :param counts: 符号计数数组(np.array)
+        :return: None
+        """
+        import os
+        import threading
+        path = os.path.join(self.directory, key + '.npy')
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as file:
+            np.save(file, counts)
+        os.replace(temp_path, path)
+        self.writes += 1
+
+    def evict(self):
+        """
+        淘汰最久未使用的条目, 直至缓存目录大小不超过上限. 条目可能同时被其他进程或线程淘汰, 已不存在的条目直接跳过
+        :return: 淘汰的条目数
+        """
+        import os
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total_size, evicted = sum(entry[1] for entry in entries), 0
+        for mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        return evicted
+
+    def file_byte_count(self, path, chunk_size=DEFAULT_CHUNK_SIZE, threads=1, stats=None):
+        """
+        统计文件中每个符号出现的次数, 文件未改变时直接使用缓存而不读取文件
+        :param path: 文件路径
+        :param chunk_size: 每块的大小(字节)
+        :param threads: 计数线程数, 0 表示使用全部CPU核心
+        :param stats: 若指定 PhaseStats, 命中缓存时记录 cache 阶段, 否则同 file_byte_count
+        :return: 符号计数数组(np.array)
+        """
+        begin_time = timeit.default_timer()
+        key = self.key(path, chunk_size)
+        counts = self.load(key)
+        if counts is None:
+            counts = file_byte_count(path, chunk_size, threads, stats)
+            self.save(key, counts)
+        elif stats:
+            stats.add('cache', timeit.default_timer() - begin_time, int(counts.sum()))
+        return counts
+
+
+def windows_peak_rss():
+    """
+    :return: 当前进程的峰值工作集(字节), 通过 Windows 的 GetProcessMemoryInfo 获取, 调用失败时返回 None
+    """
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        # PROCESS_MEMORY_COUNTERS 结构体
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    try:
+        kernel32, psapi = ctypes.WinDLL('kernel32'), ctypes.WinDLL('psapi')
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters),
+                                               wintypes.DWORD]
+        psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def peak_rss():
+    """
+    :return: 当前进程的峰值常驻内存(字节), 没有 resource 模块的 Windows 上为峰值工作集, 无法获取时返回 None
+    """
+    try:
+        import resource
+    except ImportError:
+        return windows_peak_rss()
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位, Linux 以 KiB 为单位
+    return peak if sys.platform == 'darwin' else peak << 10
+
+
+class PhaseStats:
+    """
+    按阶段(read, count, entropy, export 等)累计实际计算过程中的耗时与处理的字节数, 不重复运行任何计算
+    """
+
+    def __init__(self, trace=None):
+        """
+        :param trace: 为 tracemalloc 时, 额外记录每个阶段 Python 分配的峰值内存
+        """
+        self.phases = {}
+        self.trace = trace
+        if trace == 'tracemalloc':
+            import tracemalloc
+            tracemalloc.start()
+
+    def add(self, name, seconds, size=0):
+        """
+        累加一个阶段的耗时与字节数, 并记录此时的峰值内存
+        :param name: 阶段名称
+        :param seconds: 耗时(秒)
+        :param size: 处理的字节数
+        :return: None
+        """
+        phase = self.phases.setdefault(name, {'phase': name, 'seconds': 0., 'bytes': 0, 'calls': 0})
+        phase['seconds'] += seconds
+        phase['bytes'] += size
+        phase['calls'] += 1
+        phase['peak_rss'] = peak_rss()
+        if self.trace == 'tracemalloc':
+            import tracemalloc
+            phase['peak_traced'] = max(phase.get('peak_traced', 0), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+    def phase(self, name, size=0):
+        """
+        记录 with 语句块的耗时
+        :param name: 阶段名称
+        :param size: 处理的字节数
+        :return: 上下文管理器
+        """
+        from contextlib import contextmanager
+
+        @contextmanager
+        def timer():
+            begin_time = timeit.default_timer()
+            try:
+                yield
+            finally:
+                self.add(name, timeit.default_timer() - begin_time, size)
+        return timer()
+
+    def seconds(self, *names):
+        """
+        :param names: 阶段名称
+        :return: 这些阶段的总耗时(秒)
+        """
+        return sum(self.phases[name]['seconds'] for name in names if name in self.phases)
+
+    def records(self, **fields):
+        """
+        :param fields: 附加到每条记录的字段, 如输入文件路径
+        :return: 每个阶段一条记录(dict), 含吞吐量(MB/s), 不处理字节的阶段吞吐量为 None
+        """
+        return [dict(fields, **phase, mb_per_s=phase['bytes'] / phase['seconds'] / (1 << 20)
+                     if phase['bytes'] and phase['seconds'] else None) for phase in self.phases.values()]
+
+    def save(self, path, **fields):
+        """
+        以 JSON lines 格式附加到统计文件, 每个阶段一行
+        :param path: 统计文件路径
+        :param fields: 附加到每条记录的字段
+        :return: None
+        """
+        import json
+        with open(path, 'a') as stats_file:
+            for record in self.records(**fields):
+                stats_file.write(json.dumps(record) + '\n')
+
+
+class FileFollower:
+    """
+    跟踪不断增长的文件: 保存字节计数与已读取的位置, 每次只读取新追加的字节.
+    文件被替换(inode 改变), 截断(变短)或开头的内容改变时, 视为轮转并从头重新计数
+    """
+
+    def __init__(self, path, state_path=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param path: 被跟踪的文件路径
+        :param state_path: 状态文件路径(JSON), 若指定则在启动时恢复并在每次更新后保存
+        :param chunk_size: 每块的大小(字节)
+        """
+        self.path, self.state_path, self.chunk_size = path, state_path, chunk_size
+        self.reset()
+        self.load()
+
+    def reset(self):
+        """
+        清空计数, 下次更新时从文件开头读取
+        :return: None
+        """
+        self.counts = np.zeros(256, dtype=np.int64)
+        self.offset, self.inode, self.head = 0, None, b''
+
+    def load(self):
+        """
+        从状态文件恢复计数与读取位置, 状态文件不存在, 损坏或属于其他文件时忽略
+        :return: 是否已恢复
+        """
+        import json
+        import os
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        try:
+            with open(self.state_path, 'r') as state_file:
+                state = json.load(state_file)
+            if state['path'] != os.path.abspath(self.path) or len(state['counts']) != 256:
+                return False
+            self.counts = np.array(state['counts'], dtype=np.int64)
+            self.offset, self.inode, self.head = state['offset'], state['inode'], bytes.fromhex(state['head'])
+        except (OSError, ValueError, KeyError, TypeError):
+            self.reset()
+            return False
+        return True
+
+    def save(self):
+        """
+        先写临时文件再替换, 中断时不会留下不完整的状态文件
+        :return: None
+        """
+        import json
+        import os
+        if not self.state_path:
+            return
+        state = {'path': os.path.abspath(self.path), 'inode': self.inode, 'offset': self.offset,
+                 'head': self.head.hex(), 'counts': self.counts.tolist()}
+        with open(self.state_path + '.tmp', 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def update(self):
+        """
+        读取上次位置之后新追加的字节并累加计数
+        :return: (新读取的字节数, 是否因轮转或截断而重新计数)
+        """
+        import os
+        stat = os.stat(self.path)
+        with open(self.path, 'rb', buffering=0) as file:
+            # 比较开头的若干字节, 识别被截断后又增长到原位置之后的文件
+            head = file.read(HEAD_SIZE)
+            rescan = self.offset > 0 and (stat.st_ino != self.inode or stat.st_size < self.offset or
+                                          head[:len(self.head)] != self.head)
+            if rescan:
+                self.reset()
+            file.seek(self.offset)
+            counts = stream_byte_count(file, self.chunk_size, stat.st_size - self.offset)
+        size = int(counts.sum())
+        self.counts += counts
+        self.offset += size
+        self.inode, self.head = stat.st_ino, head[:min(HEAD_SIZE, self.offset)]
+        return size, rescan
+
+    def row(self):
+        """
+        :return: [文件路径, 文件大小, 信息熵, 时间戳(ISO 8601)]
+        """
+        import datetime
+        return [self.path, self.offset, entropy(count_to_probability(self.counts)),
+                datetime.datetime.now().isoformat(timespec='seconds')]
+
+
+def is_result_store(path):
+    """
+    :param path: 输出文件路径
+    :return: 是否为 SQLite 结果库(.db, .sqlite, .sqlite3)
+    """
+    import os
+    return bool(path) and os.path.splitext(path)[1].lower() in RESULT_STORE_EXTENSIONS
+
+
+class ResultStore:
+    """
+    SQLite 结果库(WAL 模式): 以文件路径为主键保存文件大小, 修改时间, 信息熵, 其余结果列(JSON)与字节计数.
+    WAL 模式下多个进程可以同时读取, 写入时按批在一个事务中完成
+    """
+
+    def __init__(self, path, timeout=DEFAULT_STORE_TIMEOUT):
+        """
+        :param path: 结果库文件路径, 不存在时创建
+        :param timeout: 等待其他写入者释放锁的时间(秒)
+        """
+        import sqlite3
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # WAL 模式下 NORMAL 只在检查点同步, 断电时可能丢失最后的事务但不会损坏数据库
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, size INTEGER, '
+                                    'mtime REAL, entropy REAL, extra TEXT, counts BLOB)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_entropy ON results (entropy)')
+
+    def insert(self, rows, counts=None, names=None):
+        """
+        在一个事务中插入或更新一批结果行
+        :param rows: 结果行的列表, 每行为 [文件路径, 文件大小, 信息熵, ...], 其余列以 JSON 对象保存
+        :param counts: 与结果行对应的符号计数数组的列表, 不指定时不保存计数
+        :param names: 其余列的名称(见 result_columns), 默认为 column3, column4, ...
+        :return: None
+        """
+        import json
+        import os
+        records = []
+        for row, row_counts in zip(rows, counts if counts is not None else [None] * len(rows)):
+            path = str(row[0])
+            # 标准输入与合并结果等没有对应的文件, 修改时间记为 NULL
+            mtime = os.stat(path).st_mtime if os.path.isfile(path) else None
+            blob = None if row_counts is None else ByteHistogram(row_counts).dumps()
+            extra = None
+            if len(row) > 3:
+                row_names = list(names or [])[:len(row) - 3]
+                row_names += [f'column{index}' for index in range(3 + len(row_names), len(row))]
+                extra = json.dumps(dict(zip(row_names, row[3:])), default=float)
+            records.append((path, int(row[1]), mtime, float(row[2]), extra, blob))
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)', records)
+
+    def top(self, n, pattern=None):
+        """
+        查询信息熵最高的 n 个文件, 使用 entropy 索引
+        :param n: 行数
+        :param pattern: 文件路径的 GLOB 模式, 如 *.txt
+        :return: [文件路径, 文件大小, 信息熵] 的列表
+        """
+        query = 'SELECT path, size, entropy FROM results'
+        params = ()
+        if pattern:
+            query, params = query + ' WHERE path GLOB ?', (pattern,)
+        return [list(row) for row in
+                self.connection.execute(query + ' ORDER BY entropy DESC LIMIT ?', params + (n,))]
+
+    def aggregate(self, pattern=None, batch_size=DEFAULT_STORE_BATCH):
+        """
+        合并所有匹配文件的字节计数, 按批读取以限制内存
+        :param pattern: 文件路径的 GLOB 模式, 不指定时合并全部
+        :param batch_size: 每次读取的行数
+        :return: (文件数, 字节直方图(ByteHistogram))
+        """
+        query = 'SELECT counts FROM results WHERE counts IS NOT NULL'
+        params = ()
+        if pattern:
+            query, params = query + ' AND path GLOB ?', (pattern,)
+        cursor = self.connection.execute(query, params)
+        files, counts = 0, np.zeros(256, dtype=np.int64)
+        while True:
+            blobs = cursor.fetchmany(batch_size)
+            if not blobs:
+                break
+            files += len(blobs)
+            for blob, in blobs:
+                counts += ByteHistogram.loads(blob).counts
+        return files, ByteHistogram(counts)
+
+    def close(self):
+        """
+        :return: None
+        """
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def upsert_csv_rows(path, rows):
+    """
+    按第一列(文件路径)更新csv文件中已有的行, 不存在的行附加到末尾
+    :param path: csv文件路径
+    :param rows: 要写入的行的列表
+    :return: None
+    """
+    import os
+    table = {}
+    # 读入已有的行, 保持原有顺序
+    if os.path.exists(path):
+        with open(path, 'r', newline='') as csv_file:
+            for row in csv.reader(csv_file):
+                if row:
+                    table[row[0]] = row
+        csv_file.close()
+    for row in rows:
+        table[str(row[0])] = row
+    # 先写临时文件再替换, 写入中断时不会损坏原有结果
+    with open(path + '.tmp', 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(table.values())
+    csv_file.close()
+    os.replace(path + '.tmp', path)
+
+
+def sub_byte_table(width):
+    """
+    构造查找表: 每个字节中各个 width 位符号出现的次数, 如 width 为 1 时即为每个字节中 0 与 1 的个数
+    :param width: 符号宽度(1, 2, 4 bit)
+    :return: 查找表(np.array), 形状为 (256, 2^width)
+    """
+    shifts = np.arange(0, 8, width)
+    symbols = (np.arange(256).reshape(-1, 1) >> shifts) & ((1 << width) - 1)
+    offsets = np.arange(256).reshape(-1, 1) << width
+    return np.bincount((symbols + offsets).ravel(), minlength=256 << width).reshape(256, 1 << width)
+
+
+def sub_byte_count(counts, width):
+    """
+    通过字节计数得到 width 位符号的计数, 无需再次读取数据
+    :param counts: 符号计数数组(np.array)
+    :param width: 符号宽度(1, 2, 4 bit)
+    :return: width 位符号的计数数组(np.array)
+    """
+    return counts @ sub_byte_table(width)
+
+
+def stream_symbol_count(stream, chunk_size=DEFAULT_CHUNK_SIZE, stats=None, progress=None):
+    """
+    一次读取同时统计字节, 对齐的 16 位与 32 位符号(小端序)出现的次数, 末尾不足一个符号的字节被忽略
+    :param stream: 支持 readinto 的二进制流
+    :param chunk_size: 每块的大小(字节)
+    :param stats: 若指定 PhaseStats, 分别记录 read 与 count 阶段
+    :param progress: 若指定, 每块计数后以当前的字节计数数组调用
+    :return: 字典 {8: 字节计数器, 16: 16 位符号计数器, 32: 32 位符号计数器}(NgramCounter)
+    """
+    counters = {16: NgramCounter(2), 32: NgramCounter(4)}
+    counters[8] = stream_ngram_count(stream, 1, chunk_size, stats, progress, counters)[0]
+    return counters
+
+
+def file_symbol_count(path, chunk_size=DEFAULT_CHUNK_SIZE, stats=None):
+    """
+    一次读取同时统计文件中字节, 16 位与 32 位符号出现的次数
+    :param path: 文件路径
+    :param chunk_size: 每块的大小(字节)
+    :param stats: 若指定 PhaseStats, 分别记录 read 与 count 阶段
+    :return: 字典 {8: 字节计数器, 16: 16 位符号计数器, 32: 32 位符号计数器}(NgramCounter)
+    """
+    with open(path, 'rb', buffering=0) as file:
+        return stream_symbol_count(file, chunk_size, stats)
+
+
+def symbol_entropies(counters, widths=SYMBOL_WIDTHS):
+    """
+    计算不同宽度符号的信息熵, 1, 2, 4 位符号的计数由字节计数查表得到
+    :param counters: stream_symbol_count 的结果
+    :param widths: 符号宽度(bit)的列表
+    :return: 各宽度符号的信息熵列表(bit/符号)
+    """
+    return [count_entropy(sub_byte_count(counters[8].counts, width)) if width < 8 else counters[width].entropy()
+            for width in widths]
+
+
 def append_to_csv_by_row(path, row):
     """
     将指定行附加到csv文件末尾
@@ -61,6 +1372,778 @@ def append_to_csv_by_row(path, row):
     csv_file.close()
 
 
+def append_to_csv_by_rows(path, rows):
+    """
+    将多行一次性附加到csv文件末尾, 只打开关闭文件一次
+    :param path: csv文件路径
+    :param rows: 要附加的行的列表
+    :return: None
+    """
+    # 以附加模式打开文件
+    with open(path, 'a+', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file)
+        # 缓冲写入所有行
+        csv_writer.writerows(rows)
+    csv_file.close()
+
+
+def expand_input_paths(pattern, recursive=False):
+    """
+    将命令行中的 INPUT 展开为文件路径列表
+    支持: 单个文件, 目录, 通配符(如 input/*.txt), 以及 @list.txt 形式的文件列表(每行一个路径)
+    :param pattern: INPUT 参数
+    :param recursive: 是否递归展开子目录(通配符中的 ** 同样生效)
+    :return: 文件路径列表, 顺序固定
+    """
+    import glob
+    import os
+    # 文件列表, 保持列表中的顺序
+    if pattern.startswith('@'):
+        with open(pattern[1:], 'r') as list_file:
+            return [line.strip() for line in list_file if line.strip()]
+    # 目录, 按文件名排序
+    if os.path.isdir(pattern):
+        if not recursive:
+            return [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))
+                    if os.path.isfile(os.path.join(pattern, name))]
+        paths = []
+        for root, dirs, files in os.walk(pattern):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in sorted(files))
+        return paths
+    # 通配符, 按路径排序
+    if any(char in pattern for char in '*?['):
+        return sorted(path for path in glob.glob(pattern, recursive=recursive) if os.path.isfile(path))
+    return [pattern]
+
+
+def calc_file_entropy(path, chunk_size=DEFAULT_CHUNK_SIZE, order=None, cache=None, threads=1, widths=None,
+                      with_counts=False):
+    """
+    计算单个文件的信息熵, 返回一行计算结果
+    :param path: 文件路径
+    :param chunk_size: 每块的大小(字节)
+    :param order: 若指定阶数 k, 结果行附加 k 阶块信息熵与条件信息熵
+    :param cache: 字节计数缓存(CountCache), 不指定阶数与符号宽度时使用
+    :param threads: 不指定阶数与符号宽度时的计数线程数
+    :param widths: 若指定符号宽度(bit)的列表, 结果行附加各宽度符号的信息熵
+    :param with_counts: 是否同时返回字节计数
+    :return: [文件路径, 文件大小, 信息熵(, 块信息熵, 条件信息熵)(, 各宽度符号的信息熵)],
+             with_counts 时为 (结果行, 符号计数数组)
+    """
+    # 指定符号宽度时, 字节, 元组与 16/32 位符号在同一次读取中统计
+    symbol_counters = {16: NgramCounter(2), 32: NgramCounter(4)} if widths else None
+    if order or widths:
+        counters = file_ngram_count(path, order or 1, chunk_size, symbol_counters=symbol_counters)
+        counts = counters[0].counts
+    else:
+        counts = cache.file_byte_count(path, chunk_size, threads) if cache else \
+            file_byte_count(path, chunk_size, threads)
+    row = [path, int(counts.sum()), entropy(count_to_probability(counts))]
+    if order:
+        block_entropies, cond_entropies = conditional_entropies(counters)
+        row += [block_entropies[-1], cond_entropies[-1]]
+    if widths:
+        symbol_counters[8] = counters[0]
+        row += symbol_entropies(symbol_counters, widths)
+    return (row, counts) if with_counts else row
+
+
+def calc_files_entropy(paths, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, order=None, cache=None, threads=1,
+                       widths=None, with_counts=False, skip_errors=False):
+    """
+    使用进程池批量计算文件的信息熵, 结果顺序与输入顺序一致
+    :param paths: 文件路径列表
+    :param jobs: 工作进程数, 0 表示使用全部CPU核心, 1 表示在当前进程中计算
+    :param chunk_size: 每块的大小(字节)
+    :param order: 若指定阶数 k, 结果行附加 k 阶块信息熵与条件信息熵
+    :param cache: 字节计数缓存(CountCache)
+    :param threads: 每个文件的计数线程数
+    :param widths: 若指定符号宽度(bit)的列表, 结果行附加各宽度符号的信息熵
+    :param with_counts: 是否同时返回字节计数
+    :param skip_errors: 是否跳过无法读取的文件, 其结果为 None
+    :return: 计算结果行的列表, with_counts 时为 (结果行, 符号计数数组) 的列表
+    """
+    from functools import partial
+    worker = partial(calc_file_entropy, chunk_size=chunk_size, order=order, cache=cache, threads=threads,
+                     widths=widths, with_counts=with_counts)
+    return pool_map(worker, jobs, paths, skip_errors=skip_errors)
+
+
+def skip_file_errors(worker, path, *args):
+    """
+    调用 worker, 文件无法读取(不存在, 无权限, 读取出错)时记录日志并返回 None, 不中断整批计算
+    :param worker: 第一个参数为文件路径的函数
+    :param path: 文件路径
+    :param args: 其余参数
+    :return: worker 的结果, 出错时返回 None
+    """
+    import logging
+    try:
+        return worker(path, *args)
+    except OSError as error:
+        logging.warning(f'Skipped {path}: {error}')
+        return None
+
+
+def pool_map(worker, jobs, *iterables, skip_errors=False):
+    """
+    使用进程池对每组参数调用 worker, 结果顺序与参数顺序一致
+    :param worker: 可在进程间传递的函数
+    :param jobs: 工作进程数, 0 表示使用全部CPU核心, 1 表示在当前进程中计算
+    :param iterables: 参数列表, 与 map 相同
+    :param skip_errors: 第一个参数为文件路径时, 跳过无法读取的文件, 其结果为 None
+    :return: 结果的列表
+    """
+    import os
+    from functools import partial
+    jobs = jobs or os.cpu_count()
+    iterables = [list(iterable) for iterable in iterables]
+    if skip_errors:
+        worker = partial(skip_file_errors, worker)
+    # 单进程时避免进程池的启动开销
+    if jobs == 1 or len(iterables[0]) <= 1:
+        return list(map(worker, *iterables))
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # 每次向工作进程分发一批任务, 减少进程间通信次数
+        return list(executor.map(worker, *iterables, chunksize=max(1, len(iterables[0]) // (jobs * 4))))
+
+
+def calc_file_estimate(path, block_size=DEFAULT_SAMPLE_SIZE, num_blocks=DEFAULT_SAMPLE_BLOCKS, tolerance=None,
+                       max_blocks=None, seed=None):
+    """
+    抽样估计单个文件的信息熵, 返回一行计算结果
+    :param path: 文件路径
+    :param block_size: 块大小(字节)
+    :param num_blocks: 每轮抽取的块数
+    :param tolerance: 置信区间宽度的目标值(bit/byte)
+    :param max_blocks: 最多抽取的块数
+    :param seed: 随机数种子
+    :return: [文件路径, 文件大小, 信息熵估计值, 置信区间下限, 置信区间上限]
+    """
+    import os
+    estimate, low, high, sampled = estimate_entropy(path, block_size, num_blocks, tolerance, max_blocks, seed=seed)
+    return [path, os.path.getsize(path), estimate, low, high]
+
+
+def open_count_cache(args):
+    """
+    根据命令行参数打开字节计数缓存
+    :param args: 命令行参数
+    :return: 字节计数缓存(CountCache), 未启用时返回 None
+    """
+    if not args.cache:
+        return None
+    return CountCache(args.cache, args.cache_size << 20, args.cache_hash)
+
+
+def result_columns(args):
+    """
+    根据命令行参数得到结果行中 [文件路径, 文件大小, 信息熵] 之后各列的名称
+    :param args: 命令行参数
+    :return: 列名的列表
+    """
+    if args.estimate:
+        return ['ci_low', 'ci_high']
+    if args.follow is not None:
+        return ['timestamp']
+    if args.compare or args.js_matrix:
+        return [f'{name}:{reference}' for reference in args.compare or []
+                for name in ['cross_entropy', 'kl_divergence']]
+    names = []
+    if args.order:
+        names += [f'block_entropy_{args.order}', f'conditional_entropy_{args.order}']
+    for width in args.symbol_width or []:
+        names.append(f'entropy_{width}bit')
+    return names
+
+
+def save_result_rows(args, rows, counts=None):
+    """
+    根据命令行参数将结果行附加或更新到 OUTPUT, OUTPUT 为结果库(.db, .sqlite)时写入结果库
+    :param args: 命令行参数
+    :param rows: 结果行的列表
+    :param counts: 与结果行对应的符号计数数组的列表, 仅写入结果库
+    :return: None
+    """
+    if is_result_store(args.OUTPUT):
+        with ResultStore(args.OUTPUT) as store:
+            store.insert(rows, counts, result_columns(args))
+    elif args.upsert:
+        upsert_csv_rows(args.OUTPUT, rows)
+    else:
+        append_to_csv_by_rows(args.OUTPUT, rows)
+
+
+def calc_stream_entropy(name, stream, chunk_size=DEFAULT_CHUNK_SIZE, order=None):
+    """
+    分块计算字节流的信息熵, 返回一行计算结果
+    :param name: 结果行中的名称
+    :param stream: 支持 readinto 的二进制流
+    :param chunk_size: 每块的大小(字节)
+    :param order: 若指定阶数 k, 结果行附加 k 阶块信息熵与条件信息熵
+    :return: [名称, 字节数, 信息熵(, 块信息熵, 条件信息熵)]
+    """
+    if not order:
+        counts = stream_byte_count(stream, chunk_size)
+        return [name, int(counts.sum()), entropy(count_to_probability(counts))]
+    counters = stream_ngram_count(stream, order, chunk_size)
+    counts = counters[0].counts
+    block_entropies, cond_entropies = conditional_entropies(counters)
+    return [name, int(counts.sum()), entropy(count_to_probability(counts)), block_entropies[-1], cond_entropies[-1]]
+
+
+def compressed_stream_opener(path):
+    """
+    根据扩展名返回单文件压缩流(gz, bz2, xz)的打开函数
+    :param path: 文件路径
+    :return: 打开函数, 不是压缩流时返回 None
+    """
+    import os
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.gz':
+        import gzip
+        return gzip.open
+    if extension == '.bz2':
+        import bz2
+        return bz2.open
+    if extension in ('.xz', '.lzma'):
+        import lzma
+        return lzma.open
+    return None
+
+
+def archive_type(path):
+    """
+    判断文件的压缩包类型
+    :param path: 文件路径
+    :return: 'zip', 'tar'(包括 tar.gz 等), 'stream'(单文件的 gz, bz2, xz), 不是压缩包时返回 None
+    """
+    import tarfile
+    import zipfile
+    if zipfile.is_zipfile(path):
+        return 'zip'
+    if tarfile.is_tarfile(path):
+        return 'tar'
+    if compressed_stream_opener(path):
+        return 'stream'
+    return None
+
+
+def calc_archive_entropy(path, member=None, chunk_size=DEFAULT_CHUNK_SIZE, order=None):
+    """
+    不解压到磁盘, 分块解压并计算压缩包中每个成员的信息熵, 不是压缩包时计算文件本身
+    :param path: 文件路径
+    :param member: 若指定, 只计算 zip 压缩包中的该成员
+    :param chunk_size: 每块的大小(字节)
+    :param order: 若指定阶数 k, 结果行附加 k 阶块信息熵与条件信息熵
+    :return: 结果行的列表, 成员的名称为 压缩包路径!成员名
+    """
+    import os
+    kind = archive_type(path)
+    if kind is None:
+        return [calc_file_entropy(path, chunk_size, order)]
+    rows = []
+    if kind == 'zip':
+        import zipfile
+        with zipfile.ZipFile(path) as archive:
+            names = [member] if member is not None else \
+                [info.filename for info in archive.infolist() if not info.is_dir()]
+            for name in names:
+                with archive.open(name) as stream:
+                    rows.append(calc_stream_entropy(path + ARCHIVE_MEMBER_SEPARATOR + name, stream, chunk_size,
+                                                    order))
+    elif kind == 'tar':
+        import tarfile
+        # 顺序遍历成员, 压缩的 tar 只解压一遍
+        with tarfile.open(path, 'r:*') as archive:
+            for info in archive:
+                if info.isfile():
+                    with archive.extractfile(info) as stream:
+                        rows.append(calc_stream_entropy(path + ARCHIVE_MEMBER_SEPARATOR + info.name, stream,
+                                                        chunk_size, order))
+    else:
+        # 单文件压缩流的成员名为去掉扩展名的文件名
+        name = os.path.splitext(os.path.basename(path))[0]
+        with compressed_stream_opener(path)(path, 'rb') as stream:
+            rows.append(calc_stream_entropy(path + ARCHIVE_MEMBER_SEPARATOR + name, stream, chunk_size, order))
+    return rows
+
+
+def archive_tasks(path):
+    """
+    将文件划分为可并行计算的任务, zip 压缩包的每个成员可以独立解压, 其他文件作为一个任务
+    :param path: 文件路径
+    :return: (文件路径, 成员名) 的列表
+    """
+    import zipfile
+    if not zipfile.is_zipfile(path):
+        return [(path, None)]
+    with zipfile.ZipFile(path) as archive:
+        return [(path, info.filename) for info in archive.infolist() if not info.is_dir()]
+
+
+def calc_archives_entropy(paths, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, order=None, skip_errors=False):
+    """
+    使用进程池批量计算文件及压缩包成员的信息熵, 结果顺序与输入顺序一致
+    :param paths: 文件路径列表
+    :param jobs: 工作进程数, 0 表示使用全部CPU核心, 1 表示在当前进程中计算
+    :param chunk_size: 每块的大小(字节)
+    :param order: 若指定阶数 k, 结果行附加 k 阶块信息熵与条件信息熵
+    :param skip_errors: 是否跳过无法读取的文件
+    :return: 计算结果行的列表
+    """
+    from functools import partial
+    tasks = []
+    for path in paths:
+        task = skip_file_errors(archive_tasks, path) if skip_errors else archive_tasks(path)
+        tasks += task or []
+    worker = partial(calc_archive_entropy, chunk_size=chunk_size, order=order)
+    results = pool_map(worker, jobs, [task[0] for task in tasks], [task[1] for task in tasks],
+                       skip_errors=skip_errors)
+    return [row for rows in results if rows is not None for row in rows]
+
+
+def run_merge(args, paths):
+    """
+    合并模式: 将多个字节直方图文件合并为一个, 计算整体的信息熵
+    :param args: 命令行参数
+    :param paths: 直方图文件路径列表
+    :return: None
+    """
+    import logging
+    from functools import reduce
+    histogram = reduce(ByteHistogram.merge, map(ByteHistogram.load, paths), ByteHistogram())
+    save_result_rows(args, [[args.INPUT, histogram.total(), histogram.entropy()]], [histogram.counts])
+    logging.info(f'Merged {len(paths)} histograms, saved entropy to:{args.OUTPUT}')
+    if args.export_H:
+        histogram.save(args.export_H)
+        logging.info(f'Saved merged histogram to:{args.export_H}')
+
+
+def run_follow(parser, args):
+    """
+    跟踪模式: 每隔 args.follow 秒读取 INPUT 新追加的字节, 有变化时向 OUTPUT 附加一行带时间戳的结果
+    :param parser: 命令行解析器
+    :param args: 命令行参数
+    :return: None
+    """
+    import logging
+    import os
+    import time
+    if is_stream_input(args.INPUT) or not os.path.isfile(args.INPUT):
+        parser.error('Option(--follow) requires a single regular INPUT file')
+    # 每次更新附加一行带时间戳的结果, 按路径更新的 -u 与结果库会覆盖之前的行, 丢失历史
+    if args.upsert or is_result_store(args.OUTPUT):
+        parser.error('Option(--follow) appends timestamped rows and can not be used with -u or a result store OUTPUT')
+    follower = FileFollower(args.INPUT, args.state or f'{args.OUTPUT}.state.json', args.chunk_size)
+    logging.info(f'Following {args.INPUT} from offset {follower.offset} every {args.follow} sec')
+    # 启动时总是输出一行当前的结果
+    first = True
+    while True:
+        try:
+            size, rescan = follower.update()
+        except FileNotFoundError:
+            # 轮转过程中文件可能暂时不存在
+            size, rescan = 0, False
+        if rescan:
+            logging.info(f'{args.INPUT} was truncated or rotated, rescanned from the beginning')
+        if size or rescan or first:
+            follower.save()
+            save_result_rows(args, [follower.row()], [follower.counts])
+            logging.debug(f'Read {size} new bytes, total {follower.offset} bytes')
+        first = False
+        time.sleep(args.follow)
+
+
+def load_reference_distribution(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    读入参考分布: .csv 为 [符号, 概率] 的行(byteSource 的概率分布文件或 -p 的输出),
+    字节直方图文件使用其中的计数, 其他文件统计其字节计数
+    :param path: 参考分布文件路径
+    :param chunk_size: 每块的大小(字节)
+    :return: 概率分布数组(np.array)
+    """
+    if path.lower().endswith('.csv'):
+        symbol_prob = np.zeros(256)
+        with open(path, 'r', newline='') as csv_file:
+            for symbol, probability in csv.reader(csv_file):
+                symbol_prob[int(float(symbol))] = float(probability)
+        csv_file.close()
+        return symbol_prob / symbol_prob.sum()
+    with open(path, 'rb') as file:
+        magic = file.read(len(HISTOGRAM_MAGIC))
+    file.close()
+    counts = ByteHistogram.load(path).counts if magic == HISTOGRAM_MAGIC else file_byte_count(path, chunk_size)
+    return count_to_probability(counts)
+
+
+def run_compare(args, paths):
+    """
+    比较模式: 计算每个文件对每个参考分布的交叉熵与 KL 散度, 并可输出所有文件两两之间的 JS 散度矩阵
+    结果行为 [文件路径, 文件大小, 信息熵, 对第 1 个参考分布的交叉熵, KL 散度, ...]
+    :param args: 命令行参数
+    :param paths: 文件路径列表
+    :return: None
+    """
+    import logging
+    from functools import partial
+    begin_time = timeit.default_timer()
+    cache = open_count_cache(args)
+    worker = partial(cache.file_byte_count if cache else file_byte_count, chunk_size=args.chunk_size)
+    results = pool_map(worker, args.jobs, paths, skip_errors=True)
+    # 跳过无法读取的文件, JS 散度矩阵也只包含其余文件
+    paths = [path for path, result in zip(paths, results) if result is not None]
+    counts = np.array([result for result in results if result is not None], dtype=np.int64).reshape(-1, 256)
+    if cache:
+        cache.evict()
+    sizes = counts.sum(axis=1)
+    # 空文件的概率分布记为全 0
+    p_mat = np.divide(counts, sizes[:, None], out=np.zeros(counts.shape), where=sizes[:, None] > 0)
+    rows = [[path, int(size), file_entropy] for path, size, file_entropy in
+            zip(paths, sizes.tolist(), (-xlogx(p_mat).sum(axis=1)).tolist())]
+    if args.compare:
+        q_mat = np.array([load_reference_distribution(path, args.chunk_size) for path in args.compare])
+        cross_entropies, divergences = cross_entropy_matrix(p_mat, q_mat), kl_divergence_matrix(p_mat, q_mat)
+        for row, cross_row, divergence_row in zip(rows, cross_entropies.tolist(), divergences.tolist()):
+            row += [value for pair in zip(cross_row, divergence_row) for value in pair]
+    save_result_rows(args, rows, list(counts))
+    logging.info(f'Compared {len(paths)} files with {len(args.compare or [])} references, saved to:{args.OUTPUT}')
+    if args.js_matrix:
+        js_matrix = js_divergence_matrix(p_mat, threads=args.threads)
+        if args.js_matrix.endswith('.npy'):
+            np.save(args.js_matrix, js_matrix)
+        else:
+            # 以文件路径作为行首与表头, 按行块转换为 Python 浮点数, 不一次展开整个矩阵
+            rows = max(1, arrayExport.DEFAULT_CHUNK_ROWS // max(1, len(paths)))
+            with open(args.js_matrix, 'w', newline='', buffering=arrayExport.BUFFER_SIZE) as matrix_csv:
+                csv_writer = csv.writer(matrix_csv)
+                csv_writer.writerow([''] + paths)
+                for begin in range(0, len(paths), rows):
+                    csv_writer.writerows([path] + values for path, values in
+                                         zip(paths[begin:begin + rows], js_matrix[begin:begin + rows].tolist()))
+            matrix_csv.close()
+        logging.info(f'Saved {len(paths)}x{len(paths)} Jensen-Shannon matrix to:{args.js_matrix}')
+    logging.debug(f'Calc_time:{round(timeit.default_timer() - begin_time, 5)} sec')
+
+
+def run_query(args):
+    """
+    查询模式: 将结果库中信息熵最高的文件或匹配文件的合并信息熵以CSV行输出到标准输出
+    :param args: 命令行参数
+    :return: None
+    """
+    import logging
+    import sys
+    csv_writer = csv.writer(sys.stdout)
+    with ResultStore(args.INPUT) as store:
+        if args.top is not None:
+            csv_writer.writerows(store.top(args.top, args.match))
+        if args.aggregate:
+            files, histogram = store.aggregate(args.aggregate)
+            csv_writer.writerow([args.aggregate, histogram.total(), histogram.entropy()])
+            logging.info(f'Aggregated byte counts of {files} files matching {args.aggregate}')
+            if args.export_H:
+                histogram.save(args.export_H)
+                logging.info(f'Saved aggregated histogram to:{args.export_H}')
+
+
+def run_batch(parser, args, paths):
+    """
+    批量模式: 计算多个文件的信息熵并一次性写入结果
+    :param parser: 命令行解析器
+    :param args: 命令行参数
+    :param paths: 文件路径列表
+    :return: None
+    """
+    import logging
+    # 概率数组, 自信息数组, 字节直方图与信息熵剖面只对单个文件有意义
+    if args.method or args.export_P or args.export_S or args.export_H or args.block:
+        parser.error('Option(-m, -p, -s, -H, -b) requires a single INPUT file')
+    # cProfile 与 tracemalloc 只能跟踪当前进程, 看不到工作进程中的计算
+    if args.trace and args.jobs != 1:
+        parser.error('Option(--trace) requires -j 1 for a batch of files')
+    logging.info(f'Processing {len(paths)} files with {args.jobs or "all"} job(s)')
+    stats, profiler = start_phase_stats(args)
+    begin_time = timeit.default_timer()
+    counts = None
+    if args.estimate:
+        from functools import partial
+        worker = partial(calc_file_estimate, block_size=args.sample_size, num_blocks=args.sample_blocks,
+                         tolerance=args.tolerance, max_blocks=args.max_blocks, seed=args.seed)
+        rows = pool_map(worker, args.jobs, paths, skip_errors=True)
+    elif args.archive:
+        rows = calc_archives_entropy(paths, args.jobs, args.chunk_size, args.order, skip_errors=True)
+    else:
+        cache = open_count_cache(args)
+        # 结果库同时保存每个文件的字节计数
+        results = calc_files_entropy(paths, args.jobs, args.chunk_size, args.order, cache, args.threads,
+                                     args.symbol_width, is_result_store(args.OUTPUT), skip_errors=True)
+        if cache:
+            cache.evict()
+        if is_result_store(args.OUTPUT):
+            results = [result for result in results if result is not None]
+            rows, counts = [row for row, _ in results], [counts for _, counts in results]
+        else:
+            rows = results
+    # 无法读取的文件已记录日志, 其余结果行一次写入
+    rows = [row for row in rows if row is not None]
+    # 各文件的读取, 计数与信息熵在工作进程中完成, 整体记入 count 阶段; 抽样估计只读取部分字节, 记入 estimate 阶段
+    if args.estimate:
+        stats.add('estimate', timeit.default_timer() - begin_time)
+    else:
+        stats.add('count', timeit.default_timer() - begin_time, sum(row[1] for row in rows))
+    logging.debug(f'Calc_time:{round(timeit.default_timer() - begin_time, 5)} sec')
+    with stats.phase('export'):
+        save_result_rows(args, rows, counts)
+    logging.info(f'Saved {len(rows)} entropy rows to:{args.OUTPUT}')
+    save_phase_stats(args, stats, profiler)
+
+
+def start_phase_stats(args):
+    """
+    开始记录单个文件或批量计算的各阶段统计, --trace cprofile 时同时启动 cProfile
+    :param args: 命令行参数
+    :return: (PhaseStats, 已启动的 cProfile.Profile 或 None)
+    """
+    stats = PhaseStats(args.trace)
+    profiler = None
+    if args.trace == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return stats, profiler
+
+
+def save_phase_stats(args, stats, profiler=None):
+    """
+    停止 cProfile 并输出其结果, 各阶段统计写入日志, 指定 --stats 时附加到统计文件
+    :param args: 命令行参数
+    :param stats: PhaseStats
+    :param profiler: start_phase_stats 返回的 cProfile.Profile 或 None
+    :return: None
+    """
+    import logging
+    if profiler:
+        profiler.disable()
+        save_profile(profiler, args.stats)
+    for record in stats.records():
+        logging.debug(f'Phase stats:{record}')
+    if args.stats:
+        stats.save(args.stats, input=args.INPUT)
+        logging.info(f'Saved phase stats to:{args.stats}')
+
+
+def save_profile(profiler, stats_path=None, limit=20):
+    """
+    输出 cProfile 的结果: 按累计耗时排序的前 limit 项写入日志, 指定统计文件时另存为 <统计文件>.prof
+    :param profiler: cProfile.Profile
+    :param stats_path: 统计文件路径
+    :param limit: 写入日志的函数数
+    :return: None
+    """
+    import io
+    import logging
+    import pstats
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(limit)
+    logging.info(f'Profile:\n{text.getvalue()}')
+    if stats_path:
+        profiler.dump_stats(stats_path + '.prof')
+
+
+class ServiceStream:
+    """
+    在工作线程中按块读取请求附带的原始字节, 数据由事件循环从连接中读取, 不在内存中缓存整个请求.
+    length 为 None 时为分块格式: 每块之前为一行十进制的块长度, 长度为 0 的块表示结束
+    """
+
+    def __init__(self, reader, loop, length=None):
+        """
+        :param reader: 连接的 asyncio.StreamReader
+        :param loop: 运行服务的事件循环
+        :param length: 原始字节数, None 表示分块格式
+        """
+        self.reader, self.loop, self.chunked = reader, loop, length is None
+        self.remaining, self.finished = length or 0, not length and length is not None
+
+    def call(self, coroutine):
+        """
+        :param coroutine: reader 的读取协程
+        :return: 在事件循环中运行的结果
+        """
+        import asyncio
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def readinto(self, buffer):
+        """
+        :param buffer: 可写的缓冲区(np.array 或 memoryview)
+        :return: 读入的字节数, 请求的原始字节读完时为 0
+        """
+        import asyncio
+        if not self.remaining and self.chunked and not self.finished:
+            line = self.call(self.reader.readline())
+            if not line.endswith(b'\n'):
+                raise asyncio.IncompleteReadError(line, None)
+            self.remaining = int(line)
+            if self.remaining < 0:
+                raise ValueError('Chunk length must not be negative')
+            self.finished = not self.remaining
+        if not self.remaining:
+            self.finished = True
+            return 0
+        data = self.call(self.reader.readexactly(min(len(buffer), self.remaining)))
+        memoryview(buffer).cast('B')[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def skip(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        丢弃未读取的原始字节, 使下一个请求从正确的位置开始
+        :param chunk_size: 每块的大小(字节)
+        :return: None
+        """
+        buffer = bytearray(chunk_size)
+        while self.readinto(buffer):
+            pass
+
+
+def service_result(request, stream=None, chunk_size=DEFAULT_CHUNK_SIZE, cache=None):
+    """
+    处理一个服务请求, 返回与结果行相同的字段
+    :param request: 请求(dict): path 为文件路径, 或 name 为原始字节的名称; 可选 order 阶数, P 与 S 是否返回数组
+    :param stream: 请求附带的原始字节流(支持 readinto, 如 ServiceStream), 为 None 时读取 path 指定的文件
+    :param chunk_size: 每块的大小(字节)
+    :param cache: 字节计数缓存(CountCache), 读取文件且不指定阶数时使用
+    :return: 结果(dict): path, size, entropy(, block_entropy, conditional_entropy)(, P)(, S)
+    """
+    order = request.get('order')
+    if order is not None and order not in range(1, MAX_ORDER + 1):
+        raise ValueError(f'order must be in 1-{MAX_ORDER}')
+    if stream is None:
+        path = request['path']
+        if order:
+            counters = file_ngram_count(path, order, chunk_size)
+        else:
+            counts = cache.file_byte_count(path, chunk_size) if cache else file_byte_count(path, chunk_size)
+    else:
+        # 原始字节逐块计数, 内存占用与请求大小无关
+        path = request.get('name', '-')
+        if order:
+            counters = stream_ngram_count(stream, order, chunk_size)
+        else:
+            counts = stream_byte_count(stream, chunk_size)
+    if order:
+        counts = counters[0].counts
+    p_arr = count_to_probability(counts)
+    result = {'path': path, 'size': int(counts.sum()), 'entropy': float(entropy(p_arr))}
+    if order:
+        block_entropies, cond_entropies = conditional_entropies(counters)
+        result.update(block_entropy=float(block_entropies[-1]), conditional_entropy=float(cond_entropies[-1]))
+    if request.get('P'):
+        result['P'] = p_arr.tolist()
+    if request.get('S'):
+        result['S'] = self_info(p_arr, np.zeros(256)).tolist()
+    return result
+
+
+def parse_service_address(address):
+    """
+    解析服务地址: HOST:PORT 为 TCP 地址, 其余为 Unix 套接字路径
+    :param address: 服务地址
+    :return: (host, port), Unix 套接字时为 (path, None)
+    """
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return address, None
+
+
+async def serve_entropy(address, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE, cache=None):
+    """
+    运行常驻的信息熵服务, 每行一个 JSON 请求, 每行返回一个 JSON 结果.
+    请求含 length 时, 请求行之后紧跟 length 个原始字节; 请求含 chunked 时, 请求行之后为分块的原始字节,
+    每块之前为一行十进制的块长度, 以长度为 0 的块结束. 原始字节在工作线程中边接收边计数;
+    不同连接的请求在工作线程池中并发计算; 每次请求写入缓存条目后, 在工作线程中淘汰超出 cache_size 的条目
+    :param address: 服务地址, HOST:PORT 或 Unix 套接字路径
+    :param jobs: 工作线程数, 0 表示使用全部CPU核心
+    :param chunk_size: 每块的大小(字节)
+    :param cache: 字节计数缓存(CountCache)
+    :return: None
+    """
+    import asyncio
+    import json
+    import logging
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=jobs or os.cpu_count())
+    handlers = set()
+    # 上次淘汰时缓存已写入的条目数
+    evicted_writes = 0
+
+    async def handle(reader, writer):
+        nonlocal evicted_writes
+        handlers.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    stream = None
+                    if 'length' in request:
+                        if not isinstance(request['length'], int) or request['length'] < 0:
+                            raise ValueError('length must be a non-negative integer')
+                        stream = ServiceStream(reader, loop, request['length'])
+                    elif request.get('chunked'):
+                        stream = ServiceStream(reader, loop)
+                except (ValueError, TypeError) as error:
+                    # 无法确定下一个请求的边界, 返回错误后关闭连接
+                    writer.write(json.dumps({'error': f'{type(error).__name__}: {error}'}).encode() + b'\n')
+                    break
+                try:
+                    result = await loop.run_in_executor(executor, service_result, request, stream, chunk_size, cache)
+                except Exception as error:
+                    # 单个请求的错误不影响服务与连接
+                    logging.debug(f'Request {request} failed: {error}')
+                    result = {'error': f'{type(error).__name__}: {error}'}
+                if stream is not None and not stream.finished:
+                    # 计算出错时丢弃剩余的原始字节, 无法读完时关闭连接
+                    try:
+                        await loop.run_in_executor(executor, stream.skip, chunk_size)
+                    except (ValueError, asyncio.IncompleteReadError):
+                        writer.write(json.dumps(result).encode() + b'\n')
+                        break
+                writer.write(json.dumps(result).encode() + b'\n')
+                await writer.drain()
+                if cache is not None and cache.writes != evicted_writes:
+                    # 常驻服务没有结束时的淘汰, 写入新条目后即淘汰
+                    evicted_writes = cache.writes
+                    await loop.run_in_executor(executor, cache.evict)
+        finally:
+            handlers.discard(asyncio.current_task())
+            writer.close()
+
+    host, port = parse_service_address(address)
+    server = await (asyncio.start_server(handle, host, port) if port is not None else
+                    asyncio.start_unix_server(handle, host))
+    logging.info(f'Serving on {address}')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # 停止服务时取消仍在处理的连接
+        for handler in list(handlers):
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        executor.shutdown(wait=False)
+        if port is None and os.path.exists(host):
+            os.remove(host)
+
+
 def parse_args():
     """
     根据命令行命令运行程序
@@ -69,10 +2152,12 @@ def parse_args():
     import argparse
     # 程序简介
     parser = argparse.ArgumentParser(description='Calculate entropy of file')
-    # Input 参数, 需要计算信息熵的文件路径
-    parser.add_argument('INPUT', help='File to calc entropy', nargs='?')
+    # Input 参数, 需要计算信息熵的文件路径, 也可以是 -(标准输入), 命名管道, 目录, 通配符或 @文件列表
+    parser.add_argument('INPUT', help='File to calc entropy, - for stdin, or a directory, glob or @list of files',
+                        nargs='?')
     # Output 参数, 用于附加计算结果的CSV文件的路径
-    parser.add_argument('OUTPUT', help='CSV file to append calc result', nargs='?')
+    parser.add_argument('OUTPUT', help='CSV file to append calc result, or a result store (.db, .sqlite)',
+                        nargs='?')
     # verbose 参数, 用于控制log等级
     parser.add_argument('-v', '--verbose', action="store_true",
                         help='show debug message')
@@ -81,19 +2166,160 @@ def parse_args():
                         help='use method P(S) to print probability(self information)')
     # export-P 参数, 用于控制是否输出概率数组文件
     parser.add_argument('-p', '--export_P',
-                        help='export csv file of probability to export_P')
+                        help='export csv file of probability to export_P (.npy or .raw/.bin for binary)')
     # export-S 参数, 用于控制是否输出自信息量数组文件
     parser.add_argument('-s', '--export_S',
-                        help='export csv file of self information to export_S')
+                        help='export csv file of self information to export_S (.npy or .raw/.bin for binary)')
     # test 参数, 用于控制是否进行自动测试
     parser.add_argument('-t', '--test', action="store_true",
                         help='run auto test before calc')
+    # chunk_size 参数, 用于控制分块读取文件时每块的大小
+    parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='bytes read per chunk, bounds the peak memory')
+    # jobs 参数, 用于控制批量计算时的工作进程数
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='worker processes for a batch of files, 0 for all cores')
+    # block 参数, 用于控制信息熵剖面的窗口大小
+    parser.add_argument('-b', '--block', type=int,
+                        help='calc entropy profile over windows of BLOCK bytes')
+    # stride 参数, 用于控制信息熵剖面相邻窗口的间隔
+    parser.add_argument('--stride', type=int,
+                        help='distance between profile windows, default BLOCK (no overlap)')
+    # export-E 参数, 用于控制信息熵剖面的输出文件
+    parser.add_argument('-e', '--export_E',
+                        help='export entropy profile to export_E (.npy for binary, csv otherwise)')
+    # order 参数, 用于计算 k 阶块信息熵与条件信息熵
+    parser.add_argument('-k', '--order', type=int, choices=range(1, MAX_ORDER + 1),
+                        help='append block entropy H(X1..Xk) and conditional entropy H(Xk|X1..Xk-1) to the row')
+    # cache 参数, 用于指定字节计数缓存目录, 未改变的文件不再读取
+    parser.add_argument('--cache', metavar='DIR',
+                        help='cache byte counts in DIR, keyed by path, size and mtime')
+    # cache_size 参数, 用于控制缓存目录的大小上限
+    parser.add_argument('--cache_size', type=int, default=DEFAULT_CACHE_SIZE >> 20, metavar='MB',
+                        help='evict least recently used cache entries beyond MB megabytes')
+    # cache_hash 参数, 用于将文件内容哈希加入缓存标识
+    parser.add_argument('--cache_hash', action="store_true",
+                        help='also key the cache by a content hash (reads the file)')
+    # upsert 参数, 用于更新 OUTPUT 中已有的行而不是附加重复的行
+    parser.add_argument('-u', '--upsert', action="store_true",
+                        help='replace existing rows of the same file in OUTPUT instead of appending')
+    # threads 参数, 用于控制单个文件的计数线程数
+    parser.add_argument('-T', '--threads', type=int, default=1,
+                        help='threads counting ranges of one file in parallel, 0 for all cores')
+    # export-H 参数, 用于输出可合并的字节直方图文件
+    parser.add_argument('-H', '--export_H',
+                        help='export the mergeable binary byte histogram to export_H')
+    # merge 参数, 用于合并多个字节直方图文件
+    parser.add_argument('-M', '--merge', action="store_true",
+                        help='treat INPUT as byte histogram files and reduce them into one result row')
+    # archive 参数, 用于计算压缩包中每个成员的信息熵
+    parser.add_argument('-x', '--archive', action="store_true",
+                        help='stream members of zip, tar and gz/bz2/xz files, one row per member')
+    # estimate 参数, 用于抽样估计信息熵
+    parser.add_argument('-E', '--estimate', action="store_true",
+                        help='estimate entropy from random blocks, row gets a bootstrap confidence interval')
+    # sample_size 参数, 用于控制抽样块的大小
+    parser.add_argument('--sample_size', type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help='bytes per sampled block')
+    # sample_blocks 参数, 用于控制每轮抽样的块数
+    parser.add_argument('--sample_blocks', type=int, default=DEFAULT_SAMPLE_BLOCKS,
+                        help='blocks sampled per round')
+    # tolerance 参数, 用于在置信区间足够窄时提前停止抽样
+    parser.add_argument('--tolerance', type=float,
+                        help='keep sampling rounds until the confidence interval is narrower than TOLERANCE bit')
+    # max_blocks 参数, 用于限制抽样的总块数
+    parser.add_argument('--max_blocks', type=int,
+                        help='upper bound of sampled blocks, default 16 rounds')
+    # seed 参数, 用于控制抽样的随机数种子
+    parser.add_argument('--seed', type=int,
+                        help='seed of the sampling random generator')
+    # symbol_width 参数, 用于计算不同宽度符号的信息熵
+    parser.add_argument('-W', '--symbol_width', type=int, nargs='+', choices=SYMBOL_WIDTHS,
+                        help='append entropy (bit/symbol) of symbols of each width in bits, in one pass')
+    # serve 参数, 用于以常驻服务的方式运行
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help='serve JSON-lines requests on HOST:PORT or a Unix socket path, -j sets worker threads')
+    # stats 参数, 用于输出各阶段的耗时, 字节数, 吞吐量与峰值内存
+    parser.add_argument('--stats',
+                        help='append per-phase wall time, bytes, throughput and peak RSS of a single-file or batch '
+                             'run to STATS as JSON lines')
+    # trace 参数, 用于额外开启 cProfile 或 tracemalloc
+    parser.add_argument('--trace', choices=['cprofile', 'tracemalloc'],
+                        help='also run cProfile (logged, and dumped to STATS.prof) or tracemalloc (peak per phase), '
+                             'in this process only: batch runs need -j 1')
+    # progress 参数, 用于长时间的流输入定期输出部分信息熵
+    parser.add_argument('--progress', type=int, metavar='BYTES',
+                        help='log the partial entropy every BYTES bytes read (INPUT - reads stdin)')
+    # follow 参数, 用于跟踪不断增长的文件
+    parser.add_argument('-f', '--follow', type=float, metavar='SECONDS',
+                        help='follow a growing INPUT, read only appended bytes every SECONDS and append a '
+                             'timestamped row to a csv OUTPUT (not with -u)')
+    # state 参数, 用于保存跟踪模式的计数与读取位置
+    parser.add_argument('--state',
+                        help='state file of --follow (counts, offset, inode), default OUTPUT.state.json')
+    # compare 参数, 用于计算对参考分布的交叉熵与 KL 散度
+    parser.add_argument('-C', '--compare', nargs='+', metavar='REF',
+                        help='append cross-entropy and KL divergence against each REF (probability CSV, byte '
+                             'histogram or any file)')
+    # js_matrix 参数, 用于输出所有文件两两之间的 JS 散度矩阵
+    parser.add_argument('--js_matrix',
+                        help='export the all-pairs Jensen-Shannon divergence matrix of INPUT files '
+                             '(.npy for binary, csv otherwise), -T sets threads')
+    # recursive 参数, 用于控制是否递归展开目录
+    parser.add_argument('-r', '--recursive', action="store_true",
+                        help='expand directories (and ** in globs) recursively')
+    # top 参数, 用于查询结果库中信息熵最高的文件
+    parser.add_argument('--top', type=int, metavar='N',
+                        help='print the N highest-entropy files of the INPUT result store (.db, .sqlite) as csv')
+    # match 参数, 用于限定 --top 查询的文件路径
+    parser.add_argument('--match', metavar='PATTERN',
+                        help='only query paths matching the GLOB PATTERN with --top, e.g. "*.txt"')
+    # aggregate 参数, 用于汇总结果库中匹配文件的字节计数
+    parser.add_argument('--aggregate', metavar='PATTERN',
+                        help='print the entropy of the merged byte counts of all files matching the GLOB PATTERN '
+                             'in the INPUT result store, -H exports the merged histogram')
 
     # 处理输入的命令
     args = parser.parse_args()
 
     import logging
 
+    # 信息熵剖面需要输出文件与合法的窗口参数
+    if args.block and not args.export_E:
+        parser.error('Option(-b) requires -e/--export_E')
+    if (args.block is not None and args.block <= 0) or (args.stride is not None and args.stride <= 0):
+        parser.error('BLOCK and STRIDE must be positive')
+    if args.follow is not None and args.follow <= 0:
+        parser.error('SECONDS of --follow must be positive')
+    if args.progress is not None and args.progress <= 0:
+        parser.error('BYTES of --progress must be positive')
+    if args.top is not None and args.top <= 0:
+        parser.error('N of --top must be positive')
+    if args.match and args.top is None:
+        parser.error('Option(--match) requires --top')
+    # 各阶段统计只在单个文件与批量计算中记录
+    if (args.stats or args.trace) and (args.serve or args.top is not None or args.aggregate or args.merge or
+                                       args.compare or args.js_matrix or args.follow is not None):
+        parser.error('Option(--stats, --trace) requires a single-file or batch run')
+
+    if args.serve:
+        import asyncio
+        logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+        try:
+            asyncio.run(serve_entropy(args.serve, args.jobs, args.chunk_size, open_count_cache(args)))
+        except KeyboardInterrupt:
+            logging.info('Service stopped')
+        return
+
+    if args.top is not None or args.aggregate:
+        logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+        if not is_result_store(args.INPUT):
+            parser.error('Option(--top, --aggregate) requires a result store (.db, .sqlite) as INPUT')
+        if args.OUTPUT:
+            parser.error('Option(--top, --aggregate) prints to stdout and takes no OUTPUT')
+        run_query(args)
+        return
+
     # 判断用户是否输入INPUT与OUTPUT
     if not args.INPUT or not args.OUTPUT:
         # 若输入操作(-v, -m, -p, -s),提示错误并返回
@@ -105,25 +2331,87 @@ def parse_args():
         logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
         # 输出命令信息
         logging.info(f'INPUT:{args.INPUT}, OUTPUT:{args.OUTPUT}')
-        # 将文件读入到一个np.array中
-        file_arr = open_file_as_binary_array(args.INPUT)
+        # 展开目录, 通配符与文件列表
+        paths = expand_input_paths(args.INPUT, args.recursive)
+        if args.merge:
+            run_merge(args, paths)
+            return
+        if args.compare or args.js_matrix:
+            if args.order or args.symbol_width or args.archive or args.estimate:
+                parser.error('Option(-k, -W, -x, -E) can not be used with -C/--compare or --js_matrix')
+            run_compare(args, paths)
+            return
+        if args.follow is not None:
+            try:
+                run_follow(parser, args)
+            except KeyboardInterrupt:
+                logging.info('Follow stopped')
+            return
+        if paths != [args.INPUT] or args.archive or args.estimate:
+            run_batch(parser, args, paths)
+            return
+        stats, profiler = start_phase_stats(args)
+        # 分块读取文件并统计符号计数, 读取与计数的耗时分别记入 read 与 count 阶段
+        # 指定符号宽度时, 字节, 元组与 16/32 位符号在同一次读取中统计
+        symbol_counters = {16: NgramCounter(2), 32: NgramCounter(4)} if args.symbol_width else None
+        if is_stream_input(args.INPUT) or args.progress:
+            # 标准输入与命名管道只能顺序读取一次, 需要再次读取文件的选项不可用
+            if is_stream_input(args.INPUT) and args.block:
+                parser.error('Option(-b) can not be used with a stream INPUT')
+            if args.cache or args.threads != 1:
+                parser.error('Option(--cache, -T) can not be used with a stream INPUT or --progress')
+            progress = entropy_progress(args.progress) if args.progress else None
+            with open_input_stream(args.INPUT) as stream:
+                if args.order or args.symbol_width:
+                    counters = stream_ngram_count(stream, args.order or 1, args.chunk_size, stats, progress,
+                                                  symbol_counters)
+                    counts = counters[0].counts
+                else:
+                    counts = stream_byte_count(stream, args.chunk_size, stats=stats, progress=progress)
+        elif args.order or args.symbol_width:
+            # 一次读取同时统计 1 到 k 阶元组, 第 0 个计数器即为字节计数
+            counters = file_ngram_count(args.INPUT, args.order or 1, args.chunk_size, stats, symbol_counters)
+            counts = counters[0].counts
+        else:
+            cache = open_count_cache(args)
+            counts = cache.file_byte_count(args.INPUT, args.chunk_size, args.threads, stats) if cache else \
+                file_byte_count(args.INPUT, args.chunk_size, args.threads, stats)
+            if cache:
+                cache.evict()
+        # 文件大小即符号总数
+        file_size = int(counts.sum())
+        begin_time = timeit.default_timer()
         # 计算概率数组
-        p_arr = probability(file_arr)
-        # 计算文件自信息量
-        self_information = self_info(p_arr)
+        p_arr = count_to_probability(counts)
+        # 计算文件自信息量, 未出现的符号记为 0
+        self_information = self_info(p_arr, np.zeros(256))
         # 计算文件信息熵
         file_entropy = entropy(p_arr)
+        row = [args.INPUT, file_size, file_entropy]
+        if args.order:
+            block_entropies, cond_entropies = conditional_entropies(counters)
+            for order in range(args.order):
+                logging.info(f'Order {order + 1}: block entropy:{block_entropies[order]} bit, '
+                             f'conditional entropy:{cond_entropies[order]} bit/byte')
+            row += [block_entropies[-1], cond_entropies[-1]]
+        stats.add('entropy', timeit.default_timer() - begin_time)
+        if args.symbol_width:
+            symbol_counters[8] = counters[0]
+            with stats.phase('symbol'):
+                widths_entropy = symbol_entropies(symbol_counters, args.symbol_width)
+            for width, width_entropy in zip(args.symbol_width, widths_entropy):
+                logging.info(f'{width}-bit symbol entropy:{width_entropy} bit/symbol')
+            row += widths_entropy
+        begin_time = timeit.default_timer()
         # 附加计算结果到CSV文件
-        append_to_csv_by_row(args.OUTPUT, [args.INPUT, file_arr.size, file_entropy])
+        save_result_rows(args, [row], [counts])
         # 输出计算结果保存完成
         logging.info(f'Saved entropy to:{args.OUTPUT}')
 
-        # 启用详细信息输出文件名, 文件大小, 信息熵等信息
-        globals()['file_arr'], globals()['p_arr'] = file_arr, p_arr
-        calc_time = timeit.timeit("probability(file_arr)", "entropy(p_arr)", globals=globals(), number=1)
-        logging.debug('Verbosity turned on\n' f'File:{args.INPUT}\nSize:{file_arr.size} bytes\n'
-                      f'Data array:{file_arr}\nEntropy:{file_entropy} bit/byte\n'
-                      f'Calc_time:{round(calc_time, 5)} sec')
+        # 启用详细信息输出文件名, 文件大小, 信息熵等信息, 计算耗时为实际读取与计数的耗时
+        logging.debug('Verbosity turned on\n' f'File:{args.INPUT}\nSize:{file_size} bytes\n'
+                      f'Count array:{counts}\nEntropy:{file_entropy} bit/byte\n'
+                      f'Calc_time:{round(stats.seconds("read", "count", "cache"), 5)} sec')
 
         # 若需使用方法probability查看符合概率数组
         if args.method == 'P':
@@ -134,18 +2422,32 @@ def parse_args():
             # 输出自信息量
             logging.info(f'Self Info:\n{self_information}')
 
+        # 若需输出字节直方图
+        if args.export_H:
+            ByteHistogram(counts).save(args.export_H)
+            logging.info(f'Saved byte histogram to:{args.export_H}')
+        stats.add('export', timeit.default_timer() - begin_time)
+
+        # 若需计算信息熵剖面
+        if args.block:
+            with stats.phase('profile', file_size):
+                offsets, entropies = entropy_profile(open_file_as_memmap(args.INPUT), args.block, args.stride,
+                                                     args.chunk_size)
+                save_entropy_profile(args.export_E, args.INPUT, offsets, entropies)
+            logging.info(f'Saved entropy profile of {entropies.size} windows to:{args.export_E}')
+
+        begin_time = timeit.default_timer()
         # 若需将概率数组写入文件
         if not not args.export_P:
-            with open(args.export_P, 'a+', newline='') as P_csv:
-                csv_writer = csv.writer(P_csv)
-                csv_writer.writerows(np.squeeze(np.dstack((np.arange(256), p_arr))))
-                P_csv.close()
+            arrayExport.export_array(args.export_P, [np.arange(256), p_arr], ['symbol', 'probability'], append=True)
         # 若需将自信息量数组写入文件
         if not not args.export_S:
-            with open(args.export_S, 'a+', newline='') as self_info_csv:
-                csv_writer = csv.writer(self_info_csv)
-                csv_writer.writerows(np.squeeze(np.dstack((np.arange(256), self_information))))
-                self_info_csv.close()
+            arrayExport.export_array(args.export_S, [np.arange(256), self_information], ['symbol', 'self_info'],
+                                     append=True)
+        if args.export_P or args.export_S:
+            stats.add('export', timeit.default_timer() - begin_time)
+
+        save_phase_stats(args, stats, profiler)
 
     # 判断是否进行单元测试
     if args.test:
@@ -0,0 +1,107 @@
+import json
+import os
+import socket
+import sys
+
+# 发送原始字节时每次读取的大小
+CHUNK_SIZE = 1 << 20
+
+
+def connect(address):
+    """
+    连接 calcInfo 服务, 只依赖标准库, 避免每次调用都导入 numpy
+    :param address: 服务地址, HOST:PORT 或 Unix 套接字路径
+    :return: 已连接的 socket
+    """
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return socket.create_connection((host, int(port)))
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(address)
+    return client
+
+
+def request(client, reader, message, data=None):
+    """
+    发送一个请求并读取结果
+    :param client: 已连接的 socket
+    :param reader: client 的读文件对象
+    :param message: 请求(dict)
+    :param data: 附带的原始字节(bytes), 或二进制文件对象: 按 CHUNK_SIZE 分块发送, 不读入整个文件
+    :return: 结果(dict)
+    """
+    if data is None or isinstance(data, (bytes, bytearray)):
+        if data is not None:
+            message = dict(message, length=len(data))
+        client.sendall(json.dumps(message).encode() + b'\n' + (data or b''))
+    else:
+        # 分块格式: 每块之前为一行块长度, 以长度为 0 的块结束
+        client.sendall(json.dumps(dict(message, chunked=True)).encode() + b'\n')
+        while True:
+            chunk = data.read(CHUNK_SIZE)
+            client.sendall(f'{len(chunk)}\n'.encode() + chunk)
+            if not chunk:
+                break
+    line = reader.readline()
+    if not line:
+        raise ConnectionError('Service closed the connection')
+    return json.loads(line)
+
+
+def parse_args():
+    """
+    根据命令行命令向 calcInfo 服务发送请求, 结果行输出到标准输出
+    :return: None
+    """
+    import argparse
+    import csv
+    # 程序简介
+    parser = argparse.ArgumentParser(description='Thin client of the calcInfo entropy service')
+    # ADDRESS - 服务地址
+    parser.add_argument('ADDRESS', help='HOST:PORT or Unix socket path of calcInfo.py --serve')
+    # INPUT - 需要计算信息熵的文件路径, - 表示从标准输入发送原始字节
+    parser.add_argument('INPUT', nargs='+', help='files to calc entropy, - sends the bytes of stdin')
+    # order 参数, 用于计算 k 阶块信息熵与条件信息熵
+    parser.add_argument('-k', '--order', type=int, choices=range(1, 5),
+                        help='append block entropy and conditional entropy of order k')
+    # send 参数, 用于发送文件内容而不是路径
+    parser.add_argument('--send', action='store_true',
+                        help='send file contents instead of paths, for a service on another host')
+    # export-P, export-S 参数, 用于在结果中附加概率数组与自信息量数组
+    parser.add_argument('-p', '--export_P', action='store_true', help='append the probability array')
+    parser.add_argument('-s', '--export_S', action='store_true', help='append the self information array')
+    # json 参数, 用于输出原始的 JSON 结果
+    parser.add_argument('--json', action='store_true', help='print JSON results instead of CSV rows')
+
+    # 处理输入的命令
+    args = parser.parse_args()
+
+    options = {key: value for key, value in [('order', args.order), ('P', args.export_P), ('S', args.export_S)]
+               if value}
+    writer = csv.writer(sys.stdout)
+    status = 0
+    with connect(args.ADDRESS) as client:
+        reader = client.makefile('rb')
+        for path in args.INPUT:
+            if path == '-':
+                result = request(client, reader, dict(options, name='-'), sys.stdin.buffer)
+            elif args.send:
+                with open(path, 'rb') as file:
+                    result = request(client, reader, dict(options, name=path), file)
+            else:
+                # 服务的工作目录可能不同, 发送绝对路径
+                result = request(client, reader, dict(options, path=os.path.abspath(path)))
+            if args.json:
+                print(json.dumps(result))
+            elif 'error' in result:
+                print(f'{path}: {result["error"]}', file=sys.stderr)
+            else:
+                writer.writerow([result[key] for key in ['path', 'size', 'entropy', 'block_entropy',
+                                                         'conditional_entropy'] if key in result] +
+                                result.get('P', []) + result.get('S', []))
+            status = status or int('error' in result)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    parse_args()
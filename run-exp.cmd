@@ -1,6 +1,6 @@
 :::::
 :: Run a batch experiment
-:: ver: 20210923.2001
+:: ver: 20261017.1800
 :::::
 :: Do not display every line of the code
 @echo off
@@ -16,7 +16,13 @@ set "EXP_INPUT_DIR=input"
 :: Output file for recording results
 set "EXP_OUTPUT=output\calcInfo.csv"
 
-:: Command to call for each input file
+:: Worker processes, 0 for all cores
+set "EXP_JOBS=0"
+
+:: Byte count cache, unchanged files are not read again on the next run
+set "EXP_CACHE=output\.count_cache"
+
+:: Command to call for the whole input directory
 set "EXP_CMD=python calcInfo.py"
 :: ----- Config : end
 
@@ -26,11 +32,10 @@ for %%I in ("%~dp0.") do set "SCRIPT_DIR=%%~fI"
 :: Go into the script's directory (incase this script is called from other directory)
 pushd %SCRIPT_DIR%
 
-:: Run EXP_CMD on each file in EXP_INPUT_DIR
-for %%f in ("%EXP_INPUT_DIR%\*.*") do (
-    echo Processing "%EXP_INPUT_DIR%\%%~nxf" ...
-    call %EXP_CMD% "%EXP_INPUT_DIR%\%%~nxf" "%EXP_OUTPUT%"
-)
+:: Run EXP_CMD once on all files in EXP_INPUT_DIR
+:: -u updates the rows of files already in EXP_OUTPUT instead of appending duplicates
+echo Processing "%EXP_INPUT_DIR%" ...
+call %EXP_CMD% "%EXP_INPUT_DIR%" "%EXP_OUTPUT%" -j %EXP_JOBS% --cache "%EXP_CACHE%" -u
 
 :: Return to the previous directory
 popd